@@ -1,17 +1,115 @@
+import hashlib
 import json
 import os
 import shutil
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from sklearn.model_selection import train_test_split
 
 # --- CONFIG (Updated with your paths) ---
 # We use .resolve() to ensure paths work regardless of where you run the script from
-PROJECT_ROOT = Path(__file__).parent.parent.resolve() 
-JSON_PATH = PROJECT_ROOT / "dataset" / "result.json" 
-IMAGES_DIR = PROJECT_ROOT / "dataset" / "images"      
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+JSON_PATH = PROJECT_ROOT / "dataset" / "result.json"
+IMAGES_DIR = PROJECT_ROOT / "dataset" / "images"
 OUTPUT_DIR = PROJECT_ROOT / "dataset" / "yolo_dataset"
 
+# What was written last run (source fingerprint + label hash per output image)
+MANIFEST_PATH = OUTPUT_DIR / "manifest.json"
+
+# Hardlink images into the dataset instead of copying (falls back to a copy across filesystems)
+USE_HARDLINKS = True
+WORKERS = 8
+
+# Share of images in the validation split
+VAL_FRACTION = 0.2
+
+def assign_split(file_name):
+    """
+    Split from a stable hash of the file name: an image keeps its split when
+    other images are added or removed, so incremental runs don't move files
+    between train and val (or leak old training images into val).
+    """
+    digest = hashlib.sha1(Path(file_name).name.encode()).digest()
+    return 'val' if int.from_bytes(digest[:8], "big") / 2**64 < VAL_FRACTION else 'train'
+
+def build_file_index(images_dir):
+    """
+    One directory scan for the whole run.
+    Output: (name -> Path, name without hash prefix -> Path)
+    """
+    by_name = {}
+    by_tail = {}
+    for entry in sorted(os.scandir(images_dir), key=lambda e: e.name):
+        if not entry.is_file():
+            continue
+        path = Path(entry.path)
+        by_name[entry.name] = path
+        by_tail.setdefault(entry.name.split('-', 1)[-1], path)
+    return by_name, by_tail
+
+def find_source(ls_filename, by_name, by_tail):
+    # Label Studio name in JSON: "54ca7a7e-1_p1.jpg"
+    # Real File on Disk:         "1_p1.jpg"
+
+    # 1. Try exact match
+    if ls_filename in by_name:
+        return by_name[ls_filename]
+
+    # 2. Try removing the hash prefix (everything before first '-')
+    clean_name = ls_filename.split('-', 1)[-1]
+    if '-' in ls_filename and clean_name in by_name:
+        return by_name[clean_name]
+
+    # 3. Try matching just the end of the filename (fallback)
+    if clean_name in by_tail:
+        return by_tail[clean_name]
+    return next((path for name, path in by_name.items() if name.endswith(clean_name)), None)
+
+def yolo_labels(img_info, annotations, cat_to_id):
+    lines = []
+    img_w, img_h = img_info['width'], img_info['height']
+    for ann in annotations:
+        # Convert to YOLO format
+        bbox = ann['bbox']
+        x_center = (bbox[0] + bbox[2]/2) / img_w
+        y_center = (bbox[1] + bbox[3]/2) / img_h
+        width = bbox[2] / img_w
+        height = bbox[3] / img_h
+
+        cls_idx = cat_to_id[ann['category_id']]
+        lines.append(f"{cls_idx} {x_center} {y_center} {width} {height}\n")
+    return "".join(lines)
+
+def fingerprint(path):
+    stat = path.stat()
+    return {"source": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def place_image(src_path, dst_path):
+    dst_path.unlink(missing_ok=True)
+    if USE_HARDLINKS:
+        try:
+            os.link(src_path, dst_path)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src_path, dst_path)
+
+def write_entry(job):
+    """
+    Writes one image + label pair; only the parts that changed since the last run.
+    """
+    src_path, dst_img_path, label_path, labels, copy_image, write_label = job
+    if copy_image:
+        place_image(src_path, dst_img_path)
+    if write_label:
+        label_path.write_text(labels)
+
+def load_manifest():
+    if MANIFEST_PATH.exists():
+        with open(MANIFEST_PATH, 'r') as f:
+            return json.load(f)
+    return {}
+
 def convert_coco_to_yolo():
     # 1. Load COCO JSON
     if not JSON_PATH.exists():
@@ -36,85 +134,77 @@ def convert_coco_to_yolo():
     image_map = {img['id']: img for img in data['images']}
     ann_map = {}
     for ann in data['annotations']:
-        img_id = ann['image_id']
-        if img_id not in ann_map: ann_map[img_id] = []
-        ann_map[img_id].append(ann)
+        ann_map.setdefault(ann['image_id'], []).append(ann)
 
-    # 5. Process Images
+    # 5. Split (per image, see assign_split)
     image_ids = list(image_map.keys())
-    train_ids, val_ids = train_test_split(image_ids, test_size=0.2, random_state=42)
 
-    found_count = 0
+    # 6. Plan Outputs
+    by_name, by_tail = build_file_index(IMAGES_DIR)
+    previous = load_manifest()
+    manifest = {}
+    jobs = []
     missing_count = 0
+    skipped_count = 0
 
     for img_id in image_ids:
         img_info = image_map[img_id]
-        
-        # --- ROBUST FILE FINDING (The Fix) ---
-        # Label Studio name in JSON: "54ca7a7e-1_p1.jpg"
-        # Real File on Disk:         "1_p1.jpg"
-        
-        ls_filename = Path(img_info['file_name']).name 
-        
-        # 1. Try exact match
-        found_files = list(IMAGES_DIR.glob(ls_filename))
-        
-        # 2. Try removing the hash prefix (everything before first '-')
-        if not found_files and '-' in ls_filename:
-            clean_name = ls_filename.split('-', 1)[1] 
-            found_files = list(IMAGES_DIR.glob(clean_name))
-        
-        # 3. Try matching just the end of the filename (fallback)
-        if not found_files:
-             clean_name = ls_filename.split('-', 1)[-1]
-             found_files = list(IMAGES_DIR.glob(f"*{clean_name}"))
-
-        if not found_files:
+        ls_filename = Path(img_info['file_name']).name
+        src_path = find_source(ls_filename, by_name, by_tail)
+
+        if src_path is None:
             print(f"Warning: Could not find image {ls_filename} in {IMAGES_DIR}")
             missing_count += 1
             continue
-            
-        src_path = found_files[0]
-        found_count += 1
-        
+
         # Determine Split
-        split = 'train' if img_id in train_ids else 'val'
-        
+        split = assign_split(img_info['file_name'])
+
         # Copy Image (Save as clean name)
         dst_img_path = OUTPUT_DIR / 'images' / split / src_path.name
-        shutil.copy(src_path, dst_img_path)
-
-        # Create Label File
         label_path = OUTPUT_DIR / 'labels' / split / f"{src_path.stem}.txt"
-        
-        with open(label_path, 'w') as lf:
-            if img_id in ann_map:
-                for ann in ann_map[img_id]:
-                    # Convert to YOLO format
-                    bbox = ann['bbox']
-                    img_w, img_h = img_info['width'], img_info['height']
-                    
-                    x_center = (bbox[0] + bbox[2]/2) / img_w
-                    y_center = (bbox[1] + bbox[3]/2) / img_h
-                    width = bbox[2] / img_w
-                    height = bbox[3] / img_h
-                    
-                    cls_idx = cat_to_id[ann['category_id']]
-                    lf.write(f"{cls_idx} {x_center} {y_center} {width} {height}\n")
-
-    # 6. Create YAML
+
+        labels = yolo_labels(img_info, ann_map.get(img_id, []), cat_to_id)
+        entry = {**fingerprint(src_path), "label_hash": hashlib.sha1(labels.encode()).hexdigest()}
+        key = str(dst_img_path.relative_to(OUTPUT_DIR))
+        manifest[key] = entry
+
+        # Skip anything whose source file and annotations are unchanged
+        old = previous.get(key, {})
+        copy_image = not dst_img_path.exists() or any(old.get(k) != entry[k] for k in ("source", "size", "mtime_ns"))
+        write_label = not label_path.exists() or old.get("label_hash") != entry["label_hash"]
+        if copy_image or write_label:
+            jobs.append((src_path, dst_img_path, label_path, labels, copy_image, write_label))
+        else:
+            skipped_count += 1
+
+    # 7. Remove Outputs No Longer Produced (deleted images, split changes)
+    for key in previous.keys() - manifest.keys():
+        stale = OUTPUT_DIR / key
+        stale.unlink(missing_ok=True)
+        stale_label = OUTPUT_DIR / 'labels' / stale.parent.name / f"{stale.stem}.txt"
+        stale_label.unlink(missing_ok=True)
+
+    # 8. Write Images & Labels (parallel, I/O bound)
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        list(pool.map(write_entry, jobs))
+
+    with open(MANIFEST_PATH, 'w') as mf:
+        json.dump(manifest, mf, indent=1)
+
+    # 9. Create YAML
     yaml_content = {
         'path': str(OUTPUT_DIR.absolute()),
         'train': 'images/train',
         'val': 'images/val',
         'names': {i: name for i, name in enumerate(class_names)}
     }
-    
+
     with open(OUTPUT_DIR / "dataset.yaml", 'w') as yf:
         yaml.dump(yaml_content, yf)
 
-    print(f"Done! Found {found_count} images, Missing {missing_count}.")
+    print(f"Done! Found {len(manifest)} images ({len(jobs)} written, {skipped_count} unchanged), Missing {missing_count}.")
     print(f"Data ready at {OUTPUT_DIR}")
 
 if __name__ == "__main__":
-    convert_coco_to_yolo()
\ No newline at end of file
+    convert_coco_to_yolo()
@@ -1,13 +1,21 @@
 import streamlit as st
 import pandas as pd
 from PIL import Image
-from pdf2image import convert_from_bytes
 import io
+import json
 import time
 
 # Update the import to match where you saved pipeline.py
 # If you saved it in 'src/pipeline.py', use:
 from pipeline import ReceiptPipeline 
+from src.modules.pages import render_page
+from src.modules.jobs import DONE, FAILED, JobQueue
+from src.modules.batching import BatchingService
+from src.modules.layout import LayoutIndex
+from src.modules import orientation
+from src.modules.export import flatten
+from src.modules.overlay import render_overlay
+from pathlib import Path
 # If you saved it in 'scripts/pipeline.py', keep your old import.
 
 # --- PAGE CONFIG ---
@@ -29,17 +37,30 @@ st.markdown("""
 
 # --- HEADER ---
 st.markdown('<p class="main-header">🧾 Intelligent Receipt Processor</p>', unsafe_allow_html=True)
-st.markdown("Upload a PDF to extract structured data automatically.")
+st.markdown("Upload PDFs to extract structured data automatically.")
 st.markdown("---")
 
 # --- MODEL LOADING ---
 @st.cache_resource
 def load_pipeline():
-    return ReceiptPipeline()
+    # Results persist across sessions and restarts in an on-disk cache
+    cache_dir = Path(__file__).parent.parent.resolve() / "cache"
+    # Known vendor layouts skip YOLO; new ones are learned as they come in
+    layouts = LayoutIndex(cache_dir / "layouts.json")
+    # The app needs every stage, so load them all up front in parallel
+    return ReceiptPipeline(cache_path=cache_dir / "results.sqlite", warmup=True, metrics=True, layouts=layouts)
+
+@st.cache_resource
+def load_jobs(_pipeline):
+    # One background queue for every session; finished pages are stored on disk.
+    # Pages of concurrent documents are micro-batched into shared model calls.
+    service = BatchingService(_pipeline, max_batch_size=8, max_wait=0.05)
+    return JobQueue(_pipeline, Path(__file__).parent.parent.resolve() / "cache" / "jobs", workers=2, service=service)
 
 try:
     with st.spinner("Loading Modular Architecture (YOLO + Paddle + Donut)..."):
         pipeline = load_pipeline()
+        jobs = load_jobs(pipeline)
 except Exception as e:
     st.error(f"System Failure: {e}")
     st.stop()
@@ -47,45 +68,65 @@ except Exception as e:
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("📂 Document Input")
-    uploaded_file = st.file_uploader("Drop PDF Receipt Here", type=["pdf"])
+    uploaded_files = st.file_uploader("Drop PDF Receipts Here", type=["pdf"], accept_multiple_files=True)
+    render_dpi = st.select_slider("Render DPI", options=[100, 150, 200, 300], value=200)
     
     st.markdown("---")
     st.markdown("### ⚙️ System Status")
     st.success("● Modules Loaded")
     st.info("● GPU Acceleration: Active")
+    with st.expander("Startup Times"):
+        st.json(pipeline.startup_report())
+    if pipeline.cache is not None:
+        cache_stats = pipeline.cache.stats()
+        st.caption(f"Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+    st.caption(f"Background jobs in progress: {jobs.active()}")
+    layout_stats = pipeline.layouts.stats()
+    st.caption(f"Known layouts: {layout_stats['templates']}, hit rate {layout_stats['hit_rate']:.0%} "
+               f"({layout_stats['hits']} of {layout_stats['lookups']} pages skipped YOLO)")
+    with st.expander("Batching"):
+        batching = jobs.service.stats()
+        st.caption(f"{batching['requests']} pages in {batching['batches']} batches, "
+                   f"mean size {batching['mean_batch_size']}, mean wait {batching['mean_wait_ms']} ms")
+        st.json({"batch_size": batching["batch_size"], "wait_seconds": batching["wait_seconds"]})
 
 # --- MAIN LOGIC ---
-if uploaded_file is not None:
-    # Convert PDF
-    images = convert_from_bytes(uploaded_file.read())
-    
-    if len(images) > 0:
-        target_image = images[0]
+if uploaded_files:
+    # Queue every upload (keyed on content + DPI: a rerun or reconnect finds the
+    # stored results instead of processing the document again)
+    job_ids = [jobs.submit(f.name, f.getvalue(), dpi=render_dpi) for f in uploaded_files]
+    statuses = {job_id: jobs.status(job_id) for job_id in job_ids}
+
+    # Per-document progress
+    for job_id, status in statuses.items():
+        if status["state"] == FAILED:
+            st.error(f"{status['name']}: {status['error']}")
+            if st.button("Retry", key=f"retry-{job_id}"):
+                jobs.retry(job_id)
+                st.rerun()
+        elif status["state"] != DONE:
+            st.progress(status["done"] / max(1, status["total"]),
+                        text=f"{status['name']}: page {status['done']} of {status['total']} ({status['state']})")
+
+    job_id = st.selectbox("Document", job_ids, format_func=lambda j: statuses[j]["name"])
+    page_results = jobs.results(job_id)
+    total_pages = statuses[job_id]["total"]
+
+    if len(page_results) > 0:
+        page_number = st.selectbox("Page", list(page_results), format_func=lambda n: f"Page {n} of {total_pages}")
+        target_image = render_page(jobs.document(job_id), page_number, dpi=statuses[job_id]["dpi"])
         
         # Create Two Columns: Document View vs. Data View
         col1, col2 = st.columns([1, 1.2])
         
         with col1:
             st.markdown('<p class="sub-header">📄 Original Document</p>', unsafe_allow_html=True)
-            st.image(target_image, use_container_width=True, caption="Page 1")
+            st.image(target_image, use_container_width=True, caption=f"Page {page_number}")
 
         with col2:
             st.markdown('<p class="sub-header">📊 Extracted Data</p>', unsafe_allow_html=True)
             
-            # Run Inference only once per file upload
-            if "last_uploaded" not in st.session_state or st.session_state.last_uploaded != uploaded_file.name:
-                with st.spinner("Running Perception & Extraction Pipeline..."):
-                    # Save temp file
-                    temp_path = "temp_receipt.jpg"
-                    target_image.save(temp_path)
-                    
-                    # --- THE FIX IS HERE ---
-                    # The new class uses .process(), not .predict()
-                    st.session_state.extraction_data = pipeline.process(temp_path)
-                    
-                    st.session_state.last_uploaded = uploaded_file.name
-            
-            data = st.session_state.extraction_data
+            data = page_results[page_number]
             
             # --- TABS FOR CLEAN UI vs DEBUG UI ---
             tab_data, tab_debug = st.tabs(["📝 Data Entry Form", "🛠️ Diagnostics"])
@@ -94,6 +135,10 @@ if uploaded_file is not None:
             with tab_data:
                 # Section A: Header Details (PO, Date, etc.)
                 st.subheader("Header Information")
+                if data.get("path") == "text":
+                    st.caption("⚡ Read from the PDF text layer (no OCR / Donut)")
+                elif data.get("path") == "mixed":
+                    st.caption("⚡ Partly read from the PDF text layer")
                 
                 col_a, col_b = st.columns(2)
                 with col_a:
@@ -122,19 +167,61 @@ if uploaded_file is not None:
                     st.download_button(
                         label="📥 Download Excel/CSV",
                         data=csv,
-                        file_name="extracted_receipt.csv",
+                        file_name=f"extracted_receipt_p{page_number}.csv",
                         mime="text/csv",
                         type="primary"
                     )
                 else:
                     st.warning("⚠️ No table data found. Please check the Debug tab.")
 
+                # Every page of the document as flat records (same schema as batch --export)
+                records = "".join(
+                    json.dumps(record, ensure_ascii=False) + "\n"
+                    for number, result in page_results.items()
+                    for record in flatten(statuses[job_id]["name"], number, result)
+                )
+                st.download_button("📥 Download all pages (JSONL)", records,
+                                   file_name=f"{Path(statuses[job_id]['name']).stem}.jsonl", mime="application/json")
+
             # 2. THE HIDDEN DEBUG TAB
             with tab_debug:
                 st.warning("Visual debugging for pipeline modules.")
                 
-                if "debug_image" in data:
-                    st.image(data["debug_image"], caption="Perception Module Output", use_container_width=True)
+                # Overlay is drawn only here, at screen resolution
+                if "debug" in data:
+                    # Boxes are in the coordinates of the upright page the pipeline saw
+                    overlay_base = target_image
+                    if data.get("orientation", {}).get("corrected"):
+                        overlay_base = orientation.apply(target_image, data["orientation"]).pil()
+                        st.caption(f"Page corrected: {data['orientation']['quarter_turns'] * 90}° turn, {data['orientation']['skew']}° deskew")
+                    overlay = render_overlay(overlay_base, data["debug"], max_side=1400)
+                    st.image(overlay, caption="Perception Module Output", use_container_width=True)
+                
+                # Per-stage timings for this page
+                if "metrics" in data:
+                    page_metrics = data["metrics"]
+                    st.subheader("Stage Timings")
+                    st.bar_chart(pd.Series(page_metrics["stages"], name="seconds"))
+                    
+                    col_m1, col_m2, col_m3 = st.columns(3)
+                    tokens = page_metrics["values"].get("donut_tokens", [])
+                    speed = page_metrics["values"].get("donut_tokens_per_second", [])
+                    col_m1.metric("Donut Tokens", sum(tokens))
+                    col_m2.metric("Tokens / s", f"{speed[0]:.0f}" if speed else "-")
+                    col_m3.metric("OCR Calls", page_metrics["counters"].get("ocr_calls", 0))
+                    st.caption(f"Memory: {page_metrics['memory']}")
+                
+                if pipeline.metrics is not None:
+                    with st.expander("Aggregated Metrics (all pages)"):
+                        st.code(pipeline.metrics.to_prometheus(), language="text")
+                        st.download_button("📥 Export JSON", pipeline.metrics.to_json(), file_name="pipeline_metrics.json", mime="application/json")
                 
                 with st.expander("See Raw JSON"):
-                    st.json(data)
\ No newline at end of file
+                    st.json(data)
+    else:
+        st.info("Processing... results appear here as each page completes.")
+
+    # Poll while anything is still being processed
+    if any(jobs.status(j)["state"] not in (DONE, FAILED) for j in job_ids):
+        time.sleep(1.0)
+        st.rerun()
@@ -0,0 +1,225 @@
+"""
+Headless batch runner.
+
+    python -m src.batch data/inbox --output results.jsonl --workers 4
+
+Inputs can be directories (searched recursively), glob patterns or manifest
+files (.txt / .lst, one path per line). Each worker process loads the models
+once; documents reach the workers through a bounded queue and results are
+appended to a JSONL file (one line per document) as they complete. Re-running
+with the same output file skips documents that already succeeded.
+
+    python -m src.batch data/inbox --export exports/run1 --parquet
+
+With --export, every table row is also streamed as a flat record to
+records.jsonl (and Parquet parts) in that directory; see modules/export.py.
+"""
+from pathlib import Path
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import queue
+import statistics
+import threading
+import time
+
+SUPPORTED = {".pdf", ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp"}
+MANIFESTS = {".txt", ".lst"}
+
+def collect_inputs(specs):
+    """
+    Expands directories, globs and manifests into a sorted, de-duplicated path list.
+    """
+    found = set()
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            found.update(p for p in path.rglob("*") if p.suffix.lower() in SUPPORTED)
+        elif path.is_file() and path.suffix.lower() in MANIFESTS:
+            lines = path.read_text().splitlines()
+            found.update(Path(line.strip()) for line in lines if line.strip() and not line.startswith("#"))
+        elif path.is_file():
+            found.add(path)
+        else:
+            found.update(Path(p) for p in glob.glob(spec, recursive=True) if Path(p).suffix.lower() in SUPPORTED)
+    return sorted(str(p.resolve()) for p in found)
+
+def load_completed(output_path):
+    """
+    Reads an existing output file and returns the sources that already succeeded.
+    A half-written last line (from a crash) is cut off.
+    """
+    completed = set()
+    if not output_path.exists():
+        return completed
+
+    good_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_bytes += len(line)
+            if "error" not in record:
+                completed.add(record["source"])
+
+    with open(output_path, "r+b") as f:
+        f.truncate(good_bytes)
+    return completed
+
+def _worker(tasks, results, options):
+    # Imported here so the parent process never loads the models
+    from src.pipeline import ReceiptPipeline
+
+    pipeline = ReceiptPipeline(
+        cache_path=options["cache"], backend=options["backend"], warmup=True, metrics=options["metrics"],
+        debug="off"  # nobody looks at overlays in batch runs
+    )
+
+    while True:
+        source = tasks.get()
+        if source is None:
+            break
+
+        start = time.perf_counter()
+        record = {"source": source, "pages": []}
+        try:
+            if source.lower().endswith(".pdf"):
+                pdf_bytes = Path(source).read_bytes()
+                page_start = time.perf_counter()
+                for page_number, result in pipeline.process_pdf(pdf_bytes, dpi=options["dpi"]):
+                    record["pages"].append({
+                        "page": page_number,
+                        "seconds": round(time.perf_counter() - page_start, 4),
+                        "result": result,
+                    })
+                    page_start = time.perf_counter()
+            else:
+                result = pipeline.process(source)
+                record["pages"].append({
+                    "page": 1,
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "result": result,
+                })
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+
+        record["seconds"] = round(time.perf_counter() - start, 4)
+        results.put(record)
+
+def _feed(tasks, sources, workers):
+    # Blocks whenever the queue is full, which keeps the backlog bounded
+    for source in sources:
+        tasks.put(source)
+    for _ in range(workers):
+        tasks.put(None)
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def print_summary(records, wall_seconds, skipped):
+    doc_latency = [r["seconds"] for r in records]
+    page_latency = [p["seconds"] for r in records for p in r.get("pages", [])]
+    failed = sum(1 for r in records if "error" in r)
+
+    print("\n" + "=" * 60)
+    print("Batch Summary")
+    print(f"Documents:   {len(records)} processed, {failed} failed, {skipped} skipped (already done)")
+    print(f"Pages:       {len(page_latency)}")
+    print(f"Wall time:   {wall_seconds:.1f}s")
+    if wall_seconds > 0:
+        print(f"Throughput:  {len(records) / wall_seconds:.2f} docs/s, {len(page_latency) / wall_seconds:.2f} pages/s")
+    for name, values in (("Doc latency", doc_latency), ("Page latency", page_latency)):
+        if values:
+            print(
+                f"{name + ':':<13}p50 {_percentile(values, 50):.2f}s  p95 {_percentile(values, 95):.2f}s  "
+                f"max {max(values):.2f}s  mean {statistics.mean(values):.2f}s"
+            )
+    print("=" * 60 + "\n")
+
+def run(inputs, output, workers=2, queue_size=None, dpi=200, cache=None, backend="torch", metrics=False,
+        export=None, parquet=False, row_group_size=50_000):
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    sink = None
+    if export:
+        from src.modules.export import ResultSink
+        sink = ResultSink(export, parquet=parquet, row_group_size=row_group_size)
+
+    sources = collect_inputs(inputs)
+    completed = load_completed(output)
+    todo = [s for s in sources if s not in completed]
+    print(f"Found {len(sources)} inputs, {len(sources) - len(todo)} already done, {len(todo)} to process.")
+    if not todo:
+        if sink is not None:
+            sink.close()
+        return []
+
+    workers = max(1, min(workers, len(todo)))
+    ctx = mp.get_context("spawn")
+    tasks = ctx.Queue(maxsize=queue_size or workers * 2)
+    results = ctx.Queue()
+    options = {"dpi": dpi, "cache": cache, "backend": backend, "metrics": metrics}
+
+    processes = [ctx.Process(target=_worker, args=(tasks, results, options), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    threading.Thread(target=_feed, args=(tasks, todo, workers), daemon=True).start()
+
+    start = time.perf_counter()
+    records = []
+    with open(output, "a", encoding="utf-8") as out:
+        while len(records) < len(todo):
+            try:
+                record = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):
+                    print("ERROR: All workers exited before finishing; re-run to resume.")
+                    break
+                continue
+
+            # The sink commits first: it skips documents it already has, so a
+            # crash between the two writes can't duplicate export records
+            if sink is not None:
+                pages = [(p["page"], p["result"], p["seconds"]) for p in record["pages"]]
+                sink.write_document(record["source"], pages, error=record.get("error"))
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            records.append(record)
+            status = "FAILED" if "error" in record else f"{len(record['pages'])} page(s)"
+            print(f"[{len(records)}/{len(todo)}] {Path(record['source']).name}: {status} in {record['seconds']:.2f}s")
+
+    for process in processes:
+        process.join(timeout=5)
+    if sink is not None:
+        sink.close()
+
+    print_summary(records, time.perf_counter() - start, len(sources) - len(todo))
+    return records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the receipt pipeline over many documents.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or manifest files")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes (each loads the models once)")
+    parser.add_argument("--queue-size", type=int, default=None, help="Documents waiting for a worker (default 2 per worker)")
+    parser.add_argument("--dpi", type=int, default=200, help="PDF render DPI")
+    parser.add_argument("--cache", default=None, help="Path of a shared result cache (SQLite)")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "auto"])
+    parser.add_argument("--metrics", action="store_true", help="Attach per-stage metrics to every page record")
+    parser.add_argument("--export", default=None, help="Directory for flat per-row records (records.jsonl)")
+    parser.add_argument("--parquet", action="store_true", help="With --export: also write Parquet parts (needs pyarrow)")
+    parser.add_argument("--row-group-size", type=int, default=50_000, help="Parquet records per row group")
+    args = parser.parse_args(argv)
+
+    run(args.inputs, args.output, args.workers, args.queue_size, args.dpi, args.cache, args.backend, args.metrics,
+        args.export, args.parquet, args.row_group_size)
+
+if __name__ == "__main__":
+    main()
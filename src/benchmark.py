@@ -0,0 +1,267 @@
+"""
+Offline performance benchmark for ReceiptPipeline.
+
+    python -m src.benchmark                      # stand-in models, compare to baseline
+    python -m src.benchmark --update-baseline    # record a new baseline
+    python -m src.benchmark --real               # real weights from models/
+
+Pages come from the synthetic receipt generator, so no data, network or GPU
+is needed. Each metric is the median of --repeat runs; the run fails (exit 1)
+when a metric is worse than the stored baseline by more than --threshold.
+"""
+from pathlib import Path
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import time
+
+from src.modules.synthetic import make_document, make_pdf, make_receipt, make_split_receipt, make_text_page
+from src.pipeline import ReceiptPipeline
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+BASELINE_DIR = PROJECT_ROOT / "benchmarks"
+
+def build_pipeline(real=False, correct_orientation=False, stray_boxes=False):
+    if real:
+        pipeline = ReceiptPipeline(metrics=True)
+        pipeline.correct_orientation = correct_orientation
+        missing = [p for p in (pipeline.yolo_path, pipeline.donut_path) if not p.exists()]
+        if missing:
+            raise SystemExit(f"Error: --real needs the model weights, missing: {', '.join(map(str, missing))}")
+        pipeline.warmup()
+        return pipeline
+
+    from src.modules.standins import StandInDetector, StandInExtractor, StandInReader
+    detector = StandInDetector()
+    pipeline = ReceiptPipeline(metrics=True, modules={
+        "detector": _StrayBoxDetector(detector) if stray_boxes else detector,
+        "reader": StandInReader(use_angle_cls=not correct_orientation),
+        "extractor": StandInExtractor(),
+    })
+    pipeline.correct_orientation = correct_orientation
+    return pipeline
+
+def _median_of(repeat, fn):
+    return statistics.median(fn() for _ in range(repeat))
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def run_benchmarks(pipeline, batch_sizes, page_counts, rows, repeat):
+    """
+    Output: {metric name: {"value": float, "better": "lower" | "higher"}}
+    """
+    results = {}
+    images = [make_receipt(rows=rows, seed=n)[0] for n in range(max(batch_sizes + [4]))]
+
+    # Warm-up (lazy loads, allocator, caches)
+    pipeline.process(images[0])
+
+    # 1. End-to-end and per-stage latency, one page at a time
+    samples = []
+    stage_samples = {}
+    for _ in range(repeat):
+        for image in images[:4]:
+            start = time.perf_counter()
+            result = pipeline.process(image)
+            samples.append(time.perf_counter() - start)
+            for stage, seconds in result["metrics"]["stages"].items():
+                stage_samples.setdefault(stage, []).append(seconds)
+    results["process_latency_ms"] = {"value": statistics.median(samples) * 1000, "better": "lower"}
+    for stage, values in stage_samples.items():
+        results[f"stage_{stage}_ms"] = {"value": statistics.median(values) * 1000, "better": "lower"}
+
+    # 2. Batched throughput
+    for batch_size in batch_sizes:
+        batch = images[:batch_size]
+        seconds = _median_of(repeat, lambda: _timed(lambda: pipeline.process_batch(batch, batch_size=batch_size)))
+        results[f"batch{batch_size}_pages_per_s"] = {"value": len(batch) / seconds, "better": "higher"}
+
+    # 3. Multi-page documents (in memory, then through the PDF renderer if poppler is installed)
+    for pages in page_counts:
+        document = make_document(pages=pages, rows=rows)
+        seconds = _median_of(repeat, lambda: _timed(lambda: list(pipeline.process_pages(document))))
+        results[f"doc{pages}_pages_per_s"] = {"value": pages / seconds, "better": "higher"}
+
+        seconds = _median_of(repeat, lambda: _timed(lambda: list(pipeline.process_stream(p for _, p in document))))
+        results[f"stream{pages}_pages_per_s"] = {"value": pages / seconds, "better": "higher"}
+
+        if shutil.which("pdftoppm"):
+            pdf_bytes = make_pdf(pages=pages, rows=rows)
+            seconds = _median_of(repeat, lambda: _timed(lambda: list(pipeline.process_pdf(pdf_bytes))))
+            results[f"pdf{pages}_pages_per_s"] = {"value": pages / seconds, "better": "higher"}
+
+    return results
+
+def _misoriented(image, n):
+    """
+    Every other page upright; the rest skewed, turned or flipped.
+    Output: (RGB array, (quarter turns, skew) that estimate() should return)
+    """
+    import cv2
+    import numpy as np
+    array = np.asarray(image)
+    if n % 2 == 0:
+        return array, (0, 0.0)
+    if n % 4 == 1:
+        h, w = array.shape[:2]
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), 2.0, 1.0)
+        return cv2.warpAffine(array, matrix, (w, h), borderValue=(255, 255, 255)), (0, -2.0)
+    k = 2 if n % 8 == 3 else 1
+    return np.ascontiguousarray(np.rot90(array, k)), ((4 - k) % 4, 0.0)
+
+def run_orientation_benchmark(real, rows, repeat, pages=16, skew_tolerance=0.5):
+    """
+    Orientation pre-pass cost and accuracy against the known transform, and
+    OCR time with Paddle's per-line angle classifier (no pre-pass) vs.
+    without it (pre-pass). Half the pages are receipts, half text-dense
+    pages, whose character strokes (not ruling lines) dominate the ink.
+    """
+    results = {}
+    # Each half goes through every misorientation (_misoriented cycles every 8 pages)
+    half = pages // 2
+    sources = [make_receipt(rows=rows, seed=n)[0] if n < half else make_text_page(seed=n) for n in range(pages)]
+    samples = [_misoriented(image, n % half) for n, image in enumerate(sources)]
+    for corrected in (False, True):
+        pipeline = build_pipeline(real, correct_orientation=corrected)
+        pipeline.process(samples[0][0])
+        orient, ocr, right, false_corrections = [], [], 0, 0
+        for _ in range(repeat):
+            for image, (turns, skew) in samples:
+                result = pipeline.process(image)
+                metrics = result["metrics"]
+                ocr.append(metrics["stages"].get("ocr", 0.0))
+                orient.append(metrics["stages"].get("orient", 0.0))
+                if corrected:
+                    found = result.get("orientation", {"quarter_turns": 0, "skew": 0.0, "corrected": False})
+                    right += found["quarter_turns"] == turns and abs(found["skew"] - skew) <= skew_tolerance
+                    false_corrections += found["corrected"] and turns == 0 and skew == 0.0
+        name = "no_angle_cls" if corrected else "angle_cls"
+        results[f"ocr_{name}_ms"] = {"value": statistics.median(ocr) * 1000, "better": "lower"}
+        if corrected:
+            upright = sum(1 for _, (turns, skew) in samples if turns == 0 and skew == 0.0)
+            results["orient_ms"] = {"value": statistics.median(orient) * 1000, "better": "lower"}
+            results["orientation_accuracy"] = {"value": right / (repeat * len(samples)), "better": "higher"}
+            results["orientation_false_corrections"] = {
+                "value": false_corrections / (repeat * max(1, upright)), "better": "lower"
+            }
+    return results
+
+class _StrayBoxDetector:
+    """
+    Adds a small low-confidence table box to every page, like the stray
+    YOLO hits (stamps, signature boxes) that used to stretch the union crop.
+    """
+    def __init__(self, detector):
+        self.detector = detector
+        self.device = detector.device
+
+    def detect(self, image, conf=0.1, imgsz=None):
+        return self.detect_batch([image], conf=conf, imgsz=imgsz)[0]
+
+    def detect_batch(self, images, conf=0.1, imgsz=None):
+        batches = self.detector.detect_batch(images, conf=conf, imgsz=imgsz)
+        for detections in batches:
+            detections.append({"class_id": 1, "conf": 0.15, "bbox": [1400, 250, 1560, 300]})
+        return batches
+
+def run_table_crop_benchmark(real, rows, repeat, pages=4):
+    """
+    Table crop pixels and extract time per page with one union crop vs. one
+    crop per table cluster, on pages with two separate tables (plus a stray
+    box with the stand-ins).
+    """
+    results = {}
+    images = [make_split_receipt(rows=rows, seed=n)[0] for n in range(pages)]
+    for clustering in (False, True):
+        pipeline = build_pipeline(real, stray_boxes=True)
+        pipeline.table_clustering = clustering
+        pipeline.process(images[0])
+        pixels, extract = [], []
+        for _ in range(repeat):
+            for image in images:
+                metrics = pipeline.process(image)["metrics"]
+                pixels.append(sum(metrics["values"].get("table_crop_pixels", [])))
+                extract.append(metrics["stages"].get("extract", 0.0))
+        name = "clustered" if clustering else "union"
+        results[f"table_crop_mpx_{name}"] = {"value": statistics.median(pixels) / 1e6, "better": "lower"}
+        results[f"extract_{name}_ms"] = {"value": statistics.median(extract) * 1000, "better": "lower"}
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Output: List of (metric, baseline value, new value, change) that regressed past threshold
+    """
+    regressions = []
+    for name, entry in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], entry["value"]
+        if old <= 0:
+            continue
+        change = (new - old) / old
+        worse = change > threshold if entry["better"] == "lower" else change < -threshold
+        if worse:
+            regressions.append((name, old, new, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the receipt pipeline.")
+    parser.add_argument("--real", action="store_true", help="Use the real weights in models/ instead of stand-ins")
+    parser.add_argument("--batch-sizes", default="1,4,8", help="Comma-separated batch sizes")
+    parser.add_argument("--pages", default="1,5,20", help="Comma-separated document page counts")
+    parser.add_argument("--rows", type=int, default=12, help="Table rows per synthetic page")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is kept)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON (default benchmarks/baseline_<mode>.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--output", default=None, help="Also write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+
+    mode = "real" if args.real else "standin"
+    baseline_path = Path(args.baseline) if args.baseline else BASELINE_DIR / f"baseline_{mode}.json"
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",")]
+    page_counts = [int(x) for x in args.pages.split(",")]
+
+    pipeline = build_pipeline(args.real)
+    results = run_benchmarks(pipeline, batch_sizes, page_counts, args.rows, args.repeat)
+    results.update(run_orientation_benchmark(args.real, args.rows, args.repeat))
+    results.update(run_table_crop_benchmark(args.real, args.rows, args.repeat))
+
+    baseline = {}
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())["metrics"]
+
+    print("\n" + "=" * 72)
+    print(f"Benchmark ({mode})")
+    print(f"{'metric':<32}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, entry in results.items():
+        old = baseline.get(name, {}).get("value")
+        old_text = f"{old:.2f}" if old is not None else "-"
+        change = f"{(entry['value'] - old) / old:+.1%}" if old else "-"
+        print(f"{name:<32}{old_text:>12}{entry['value']:>12.2f}{change:>10}")
+    print("=" * 72)
+
+    record = {"mode": mode, "rows": args.rows, "repeat": args.repeat, "metrics": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(record, indent=2))
+
+    if args.update_baseline or not baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(record, indent=2))
+        print(f"Baseline written to {baseline_path}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, old, new, change in regressions:
+        print(f"❌ REGRESSION {name}: {old:.2f} -> {new:.2f} ({change:+.1%}, limit {args.threshold:.0%})")
+    if not regressions:
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
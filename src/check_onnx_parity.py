@@ -0,0 +1,105 @@
+from pathlib import Path
+import sys
+import time
+
+from PIL import Image
+
+from src.modules.detector import TableDetector
+from src.modules.evaluation import iou
+from src.modules.extractor import TableParser
+
+# --- CONFIGURATION ---
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+
+# Images to compare on (the validation split is a good sample)
+INPUT_FOLDER = PROJECT_ROOT / "data" / "yolo_dataset" / "images" / "val"
+
+YOLO_PATH = PROJECT_ROOT / "models" / "detector" / "receipt_detector_v1" / "weights" / "best.pt"
+DONUT_PATH = PROJECT_ROOT / "models" / "extractor"
+
+# Adoption thresholds
+MIN_BOX_IOU = 0.9          # matched boxes must overlap at least this much
+MIN_BOX_AGREEMENT = 0.95   # share of PyTorch boxes that ONNX reproduces
+MIN_TABLE_AGREEMENT = 0.9  # share of table fields that come out identical
+
+MAX_IMAGES = 20
+
+def match_boxes(reference, candidate):
+    """
+    Output: (matched, total) reference boxes that have a same-class candidate above MIN_BOX_IOU
+    """
+    matched = 0
+    for ref in reference:
+        best = max((iou(ref['bbox'], c['bbox']) for c in candidate if c['class_id'] == ref['class_id']), default=0.0)
+        if best >= MIN_BOX_IOU:
+            matched += 1
+    return matched, len(reference)
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            yield from flatten(inner, f"{prefix}/{key}")
+    elif isinstance(value, list):
+        for i, inner in enumerate(value):
+            yield from flatten(inner, f"{prefix}[{i}]")
+    else:
+        yield prefix, value
+
+def field_agreement(reference, candidate):
+    ref, cand = dict(flatten(reference)), dict(flatten(candidate))
+    if not ref:
+        return (1, 1) if not cand else (0, len(cand))
+    return sum(1 for key, value in ref.items() if cand.get(key) == value), len(ref)
+
+def check_parity():
+    """Runs both backends on the same images and compares their outputs."""
+
+    images = sorted(p for p in INPUT_FOLDER.glob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png"))[:MAX_IMAGES]
+    if not images:
+        print(f"Error: No images found in {INPUT_FOLDER}")
+        return False
+
+    print("Loading PyTorch and ONNX backends (exports on first run)...")
+    detectors = {b: TableDetector(YOLO_PATH, "cpu", backend=b) for b in ("torch", "onnx")}
+    parsers = {b: TableParser(DONUT_PATH, "cpu", backend=b) for b in ("torch", "onnx")}
+
+    timings = {"torch": 0.0, "onnx": 0.0}
+    boxes_matched = boxes_total = fields_matched = fields_total = 0
+
+    for path in images:
+        image = Image.open(path).convert("RGB")
+        outputs = {}
+        for backend in ("torch", "onnx"):
+            start = time.perf_counter()
+            detections = detectors[backend].detect(image)
+            tables = [d['bbox'] for d in detections if d['class_id'] == 1]
+            crop = image.crop(tables[0]) if tables else None
+            table = parsers[backend].extract_table(crop) if crop is not None else {}
+            timings[backend] += time.perf_counter() - start
+            outputs[backend] = (detections, table)
+
+        box_hits, box_count = match_boxes(outputs["torch"][0], outputs["onnx"][0])
+        boxes_matched += box_hits
+        boxes_total += box_count
+
+        field_hits, field_count = field_agreement(outputs["torch"][1], outputs["onnx"][1])
+        fields_matched += field_hits
+        fields_total += field_count
+        print(f"  {path.name}: boxes {box_hits}/{box_count}, fields {field_hits}/{field_count}")
+
+    box_agreement = boxes_matched / boxes_total if boxes_total else 1.0
+    table_agreement = fields_matched / fields_total if fields_total else 1.0
+    passed = box_agreement >= MIN_BOX_AGREEMENT and table_agreement >= MIN_TABLE_AGREEMENT
+
+    print("\n" + "=" * 60)
+    print(f"Images:            {len(images)}")
+    print(f"Box agreement:     {box_agreement:.1%} (min {MIN_BOX_AGREEMENT:.0%})")
+    print(f"Table agreement:   {table_agreement:.1%} (min {MIN_TABLE_AGREEMENT:.0%})")
+    print(f"PyTorch CPU time:  {timings['torch'] / len(images):.2f}s per page")
+    print(f"ONNX time:         {timings['onnx'] / len(images):.2f}s per page (YOLO fp32, Donut INT8 MatMul/Gemm)")
+    print("✅ Parity OK" if passed else "❌ Parity check FAILED")
+    print("=" * 60 + "\n")
+    return passed
+
+if __name__ == "__main__":
+    sys.exit(0 if check_parity() else 1)
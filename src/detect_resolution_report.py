@@ -0,0 +1,142 @@
+"""
+Accuracy vs. latency of YOLO detection at reduced input resolutions.
+
+    python -m src.detect_resolution_report                       # validation split, real weights
+    python -m src.detect_resolution_report --synthetic 20        # synthetic pages, stand-in detector
+    python -m src.detect_resolution_report --sizes full,1280,960,640
+
+Each page is decoded straight to the detection size (JPEG draft mode where
+possible), detected, and the boxes are mapped back to full-page coordinates
+before being matched against the ground truth. Use the table to pick
+ReceiptPipeline.detect_size.
+"""
+from pathlib import Path
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+
+from src.modules.detector import network_size, scale_detections
+from src.modules.evaluation import load_yolo_labels, match_detections
+from src.modules.loader import load_for_detection
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+VAL_IMAGES = PROJECT_ROOT / "data" / "yolo_dataset" / "images" / "val"
+VAL_LABELS = PROJECT_ROOT / "data" / "yolo_dataset" / "labels" / "val"
+YOLO_PATH = PROJECT_ROOT / "models" / "detector" / "receipt_detector_v1" / "weights" / "best.pt"
+
+def validation_samples(limit):
+    """
+    Output: List of (name, encoded bytes, ground truth boxes)
+    """
+    from PIL import Image
+
+    samples = []
+    paths = sorted(p for p in VAL_IMAGES.glob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    for path in paths[:limit]:
+        data = path.read_bytes()
+        size = Image.open(io.BytesIO(data)).size
+        samples.append((path.name, data, load_yolo_labels(VAL_LABELS / f"{path.stem}.txt", size)))
+    return samples
+
+def synthetic_samples(count):
+    from src.modules.synthetic import make_receipt
+
+    samples = []
+    for n in range(count):
+        image, truth = make_receipt(seed=n)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        boxes = [{"class_id": 0, "bbox": truth["po_box"]}, {"class_id": 1, "bbox": truth["table_box"]}]
+        samples.append((f"synthetic_{n}.jpg", buffer.getvalue(), boxes))
+    return samples
+
+def evaluate_size(detector, samples, max_side, conf, min_iou):
+    decode_times, detect_times = [], []
+    totals = {"tp": 0, "fp": 0, "fn": 0}
+    ious = []
+    per_class = {}
+
+    for _, data, truth in samples:
+        start = time.perf_counter()
+        page, original = load_for_detection(data, max_side)
+        decode_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        detections = detector.detect(page.bgr, conf=conf, imgsz=network_size(max_side))
+        scale = (original[0] / page.width, original[1] / page.height)
+        detections = scale_detections(detections, scale, original)
+        detect_times.append(time.perf_counter() - start)
+
+        match = match_detections(truth, detections, min_iou)
+        for key in totals:
+            totals[key] += match[key]
+        ious.extend(match["ious"])
+        for cls in {t["class_id"] for t in truth}:
+            m = match_detections([t for t in truth if t["class_id"] == cls],
+                                 [d for d in detections if d["class_id"] == cls], min_iou)
+            hits, count = per_class.get(cls, (0, 0))
+            per_class[cls] = (hits + m["tp"], count + m["tp"] + m["fn"])
+
+    found = totals["tp"] + totals["fp"]
+    expected = totals["tp"] + totals["fn"]
+    return {
+        "size": max_side or "full",
+        "decode_ms": statistics.median(decode_times) * 1000,
+        "detect_ms": statistics.median(detect_times) * 1000,
+        "precision": totals["tp"] / found if found else 1.0,
+        "recall": totals["tp"] / expected if expected else 1.0,
+        "mean_iou": statistics.mean(ious) if ious else 0.0,
+        "class_recall": {str(cls): hits / count for cls, (hits, count) in sorted(per_class.items()) if count},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detection accuracy vs. latency across input sizes.")
+    parser.add_argument("--sizes", default="full,1280,960,800,640", help="Comma-separated longest sides ('full' = no downscaling)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N", help="Use N synthetic pages and the stand-in detector")
+    parser.add_argument("--limit", type=int, default=50, help="Validation images to use")
+    parser.add_argument("--conf", type=float, default=0.1, help="Detection confidence threshold")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for a match")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--output", default=None, help="Also write the report to a JSON file")
+    args = parser.parse_args(argv)
+
+    sizes = [None if s.strip() == "full" else int(s) for s in args.sizes.split(",")]
+
+    if args.synthetic:
+        from src.modules.standins import StandInDetector
+        detector = StandInDetector()
+        samples = synthetic_samples(args.synthetic)
+    else:
+        if not YOLO_PATH.exists():
+            print(f"Error: Model not found at {YOLO_PATH} (use --synthetic for an offline run)")
+            return 1
+        from src.modules.detector import TableDetector
+        detector = TableDetector(YOLO_PATH, device=args.device)
+        samples = validation_samples(args.limit)
+
+    if not samples:
+        print(f"Error: No images found in {VAL_IMAGES}")
+        return 1
+
+    # Warm-up so the first size doesn't pay for model initialisation
+    evaluate_size(detector, samples[:1], sizes[0], args.conf, args.iou)
+    rows = [evaluate_size(detector, samples, size, args.conf, args.iou) for size in sizes]
+
+    print("\n" + "=" * 78)
+    print(f"Detection resolution report ({len(samples)} pages, IoU >= {args.iou})")
+    print(f"{'size':>6}{'decode ms':>11}{'detect ms':>11}{'precision':>11}{'recall':>9}{'mean IoU':>10}  class recall")
+    for row in rows:
+        classes = ", ".join(f"{cls}: {value:.0%}" for cls, value in row["class_recall"].items())
+        print(f"{row['size']:>6}{row['decode_ms']:>11.1f}{row['detect_ms']:>11.1f}"
+              f"{row['precision']:>11.1%}{row['recall']:>9.1%}{row['mean_iou']:>10.3f}  {classes}")
+    print("=" * 78)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"pages": len(samples), "sizes": rows}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
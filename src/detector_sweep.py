@@ -0,0 +1,187 @@
+"""
+Speed/accuracy sweep for the YOLO detector.
+
+    python -m src.detector_sweep                                   # evaluate the current weights
+    python -m src.detector_sweep --train --models n,s --imgsz 640,960,1280
+    python -m src.detector_sweep --weights a.pt,b.pt --conf 0.1,0.25 --floor 0.9
+
+Every (model, image size) pair is trained, or evaluated from existing weights,
+on data/yolo_dataset. It is scored with Ultralytics' val at every confidence
+threshold and timed on the CPU through TableDetector. The report marks the
+Pareto front (latency vs. mAP50) and picks the fastest configuration that
+meets --floor.
+"""
+from pathlib import Path
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from PIL import Image
+
+from src.modules.detector import TableDetector
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+DATA_YAML = PROJECT_ROOT / "data" / "yolo_dataset" / "dataset.yaml"
+VAL_IMAGES = PROJECT_ROOT / "data" / "yolo_dataset" / "images" / "val"
+SWEEP_DIR = PROJECT_ROOT / "models" / "detector" / "sweep"
+CURRENT_WEIGHTS = PROJECT_ROOT / "models" / "detector" / "receipt_detector_v1" / "weights" / "best.pt"
+
+def train_weights(size, imgsz, epochs, batch, retrain=False):
+    """
+    Trains yolov8<size> at imgsz (reusing an earlier sweep run unless retrain).
+    Output: Path to best.pt
+    """
+    name = f"yolov8{size}_{imgsz}"
+    weights = SWEEP_DIR / name / "weights" / "best.pt"
+    if weights.exists() and not retrain:
+        print(f"Reusing {weights}")
+        return weights
+
+    from ultralytics import YOLO
+    print(f"Training yolov8{size}.pt at imgsz={imgsz}...")
+    YOLO(f"yolov8{size}.pt").train(
+        data=str(DATA_YAML), epochs=epochs, imgsz=imgsz, batch=batch,
+        project=str(SWEEP_DIR), name=name, exist_ok=True, plots=False,
+    )
+    return weights
+
+def evaluate(weights, imgsz, conf):
+    """
+    Output: Accuracy of weights on the validation split at this operating point
+    """
+    from ultralytics import YOLO
+    metrics = YOLO(str(weights)).val(
+        data=str(DATA_YAML), imgsz=imgsz, conf=conf, device="cpu", plots=False, verbose=False,
+    )
+    return {
+        "map50": float(metrics.box.map50),
+        "map50_95": float(metrics.box.map),
+        "precision": float(metrics.box.mp),
+        "recall": float(metrics.box.mr),
+    }
+
+def time_cpu(detector, imgsz, conf, images, batch_size, repeat):
+    """
+    Input: A CPU TableDetector; conf matters since NMS and box decoding scale
+           with the number of candidates above it
+    Output: Median single-page latency (ms) and batched throughput (pages/s) on the CPU
+    """
+    detector.detect(images[0], conf=conf, imgsz=imgsz)  # warm-up
+
+    latencies = []
+    for _ in range(repeat):
+        for image in images:
+            start = time.perf_counter()
+            detector.detect(image, conf=conf, imgsz=imgsz)
+            latencies.append(time.perf_counter() - start)
+
+    batch = (images * batch_size)[:batch_size]
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        detector.detect_batch(batch, conf=conf, imgsz=imgsz)
+        seconds.append(time.perf_counter() - start)
+
+    return {
+        "latency_ms": statistics.median(latencies) * 1000,
+        "pages_per_s": batch_size / statistics.median(seconds),
+    }
+
+def pareto_front(rows):
+    """
+    Output: Rows not beaten by another row on both latency (lower) and mAP50 (higher)
+    """
+    front = []
+    for row in rows:
+        dominated = any(
+            other["latency_ms"] <= row["latency_ms"] and other["map50"] >= row["map50"]
+            and (other["latency_ms"] < row["latency_ms"] or other["map50"] > row["map50"])
+            for other in rows
+        )
+        if not dominated:
+            front.append(row)
+    return front
+
+def _csv(value, cast=str):
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detector model size / image size / confidence sweep.")
+    parser.add_argument("--train", action="store_true", help="Train one model per (size, imgsz) instead of using --weights")
+    parser.add_argument("--retrain", action="store_true", help="With --train: ignore earlier sweep runs")
+    parser.add_argument("--models", default="n,s", help="YOLOv8 sizes to train (n,s,m,l,x)")
+    parser.add_argument("--weights", default=str(CURRENT_WEIGHTS), help="Comma-separated weights to evaluate (without --train)")
+    parser.add_argument("--imgsz", default="640,960,1280", help="Comma-separated input sizes")
+    parser.add_argument("--conf", default="0.1,0.25", help="Comma-separated confidence thresholds")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=4, help="Training batch size")
+    parser.add_argument("--time-batch", type=int, default=8, help="Batch size for the throughput measurement")
+    parser.add_argument("--images", type=int, default=10, help="Validation images used for timing")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--floor", type=float, default=0.9, help="Minimum acceptable mAP50")
+    parser.add_argument("--output", default=None, help="Also write the report to a JSON file")
+    args = parser.parse_args(argv)
+
+    if not DATA_YAML.exists():
+        print(f"Error: Could not find dataset.yaml at {DATA_YAML}")
+        return 1
+    paths = sorted(p for p in VAL_IMAGES.glob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png"))[:args.images]
+    if not paths:
+        print(f"Error: No images found in {VAL_IMAGES}")
+        return 1
+    images = [Image.open(p).convert("RGB") for p in paths]
+
+    # (label, weights path) per image size
+    sizes = _csv(args.imgsz, int)
+    candidates = []
+    for imgsz in sizes:
+        if args.train:
+            for model in _csv(args.models):
+                weights = train_weights(model, imgsz, args.epochs, args.batch, args.retrain)
+                candidates.append((f"yolov8{model}", weights, imgsz))
+        else:
+            for weights in _csv(args.weights, Path):
+                candidates.append((weights.parent.parent.name if weights.parent.name == "weights" else weights.stem, weights, imgsz))
+
+    rows = []
+    for label, weights, imgsz in candidates:
+        if not weights.exists():
+            print(f"Warning: Skipping missing weights {weights}")
+            continue
+        detector = TableDetector(weights, device="cpu")
+        for conf in _csv(args.conf, float):
+            timing = time_cpu(detector, imgsz, conf, images, args.time_batch, args.repeat)
+            rows.append({"model": label, "weights": str(weights), "imgsz": imgsz, "conf": conf,
+                         **evaluate(weights, imgsz, conf), **timing})
+
+    if not rows:
+        print("Error: Nothing to evaluate")
+        return 1
+
+    front = pareto_front(rows)
+    passing = [row for row in rows if row["map50"] >= args.floor]
+    best = min(passing, key=lambda row: row["latency_ms"]) if passing else None
+
+    print("\n" + "=" * 96)
+    print(f"Detector sweep ({len(images)} timing images, CPU)   * = Pareto front")
+    print(f"  {'model':<22}{'imgsz':>6}{'conf':>6}{'mAP50':>8}{'mAP50-95':>10}{'P':>7}{'R':>7}{'ms/page':>10}{'pages/s':>9}")
+    for row in sorted(rows, key=lambda r: r["latency_ms"]):
+        mark = "*" if row in front else " "
+        print(f"{mark} {row['model']:<22}{row['imgsz']:>6}{row['conf']:>6.2f}{row['map50']:>8.3f}{row['map50_95']:>10.3f}"
+              f"{row['precision']:>7.2f}{row['recall']:>7.2f}{row['latency_ms']:>10.1f}{row['pages_per_s']:>9.2f}")
+    print("=" * 96)
+    if best:
+        print(f"✅ Fastest with mAP50 >= {args.floor}: {best['model']} imgsz={best['imgsz']} conf={best['conf']} "
+              f"({best['latency_ms']:.1f} ms/page, mAP50 {best['map50']:.3f})")
+    else:
+        print(f"❌ No configuration reaches mAP50 >= {args.floor}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(
+            {"floor": args.floor, "rows": rows, "pareto": front, "recommended": best}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.modules.metrics import Histogram
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+_STOP = object()
+
+class BatchingService:
+    """
+    Micro-batching front end for a shared ReceiptPipeline.
+
+    Callers on any thread submit() single pages and get a Future back. A
+    collector thread takes the first waiting page, keeps collecting for up to
+    max_wait seconds (or until max_batch_size pages), and runs them all through
+    process_batch: one YOLO pass, one recognition batch and one Donut generate
+    for the whole group. Each caller's Future then gets its own result.
+    Futures cancelled before their batch starts are dropped from it.
+    """
+    def __init__(self, pipeline, max_batch_size=8, max_wait=0.02):
+        self.pipeline = pipeline
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Histogram(BATCH_BUCKETS)
+        self._waits = Histogram(WAIT_BUCKETS)
+        self._max_wait_seen = 0.0
+        self._busy_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._collect, name="batching-service", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, text_layer=None):
+        """
+        Input: Anything process() accepts; optionally the page's PageText
+        Output: Future resolving to the page's result dict
+        """
+        future = Future()
+        self._queue.put((image, text_layer, future, time.perf_counter()))
+        return future
+
+    def process(self, image, text_layer=None):
+        """
+        Blocking convenience wrapper around submit().
+        """
+        return self.submit(image, text_layer).result()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            batches = self._batch_sizes.n
+            return {
+                "batches": batches,
+                "requests": int(self._batch_sizes.total),
+                "mean_batch_size": round(self._batch_sizes.total / batches, 2) if batches else 0.0,
+                "mean_wait_ms": round(self._waits.total / self._waits.n * 1000, 2) if self._waits.n else 0.0,
+                "max_wait_ms": round(self._max_wait_seen * 1000, 2),
+                "busy_seconds": round(self._busy_seconds, 4),
+                "queue_depth": self._queue.qsize(),
+                "batch_size": self._batch_sizes.as_dict(),
+                "wait_seconds": self._waits.as_dict(),
+            }
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            stopping = False
+
+            # Keep the window open until it is full or max_wait has passed
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._run(batch)
+            except Exception as e:
+                # Never let one batch end the collector; its callers get the error
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            if stopping:
+                return
+
+    def _run(self, batch):
+        # Marks the futures as running; cancelled ones leave the batch
+        batch = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        start = time.perf_counter()
+        with self._lock:
+            self._batch_sizes.observe(len(batch))
+            for _, _, _, submitted in batch:
+                wait = start - submitted
+                self._waits.observe(wait)
+                self._max_wait_seen = max(self._max_wait_seen, wait)
+
+        futures = [future for _, _, future, _ in batch]
+        try:
+            results = self.pipeline.process_batch(
+                [image for image, _, _, _ in batch],
+                batch_size=len(batch),
+                text_layers=[text_layer for _, text_layer, _, _ in batch],
+            )
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+        with self._lock:
+            self._busy_seconds += time.perf_counter() - start
@@ -0,0 +1,84 @@
+"""
+Table box post-processing: instead of one min/max union of every class-1
+box, boxes are filtered, clustered into separate tables and cleaned of
+stray detections, so each table gets its own right-sized crop.
+"""
+
+def _touches(a, b, gap):
+    # Overlapping, or closer than `gap` pixels on both axes
+    return (a[0] - gap <= b[2] and b[0] - gap <= a[2] and
+            a[1] - gap <= b[3] and b[1] - gap <= a[3])
+
+def _area(box):
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+def cluster_boxes(detections, min_conf=0.25, gap=20, min_area_ratio=0.05):
+    """
+    Input: Table detections ({"bbox", "conf"}) of one page
+           min_conf: boxes below it are dropped (the most confident box is always kept)
+           gap: boxes closer than this (px) belong to the same table
+           min_area_ratio: clusters smaller than this fraction of the largest one, and
+                           less confident than it, are stray detections and dropped
+    Output: List of {"bbox", "conf", "members"} per table, top to bottom
+    """
+    if not detections:
+        return []
+
+    best = max(detections, key=lambda d: d['conf'])
+    kept = [d for d in detections if d['conf'] >= min_conf] or [best]
+
+    # Union-find over overlapping / adjacent boxes
+    parent = list(range(len(kept)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(kept)):
+        for j in range(i + 1, len(kept)):
+            if _touches(kept[i]['bbox'], kept[j]['bbox'], gap):
+                parent[find(i)] = find(j)
+
+    groups = {}
+    for i, det in enumerate(kept):
+        groups.setdefault(find(i), []).append(det)
+
+    clusters = []
+    for members in groups.values():
+        boxes = [d['bbox'] for d in members]
+        clusters.append({
+            "bbox": [min(b[0] for b in boxes), min(b[1] for b in boxes),
+                     max(b[2] for b in boxes), max(b[3] for b in boxes)],
+            "conf": max(d['conf'] for d in members),
+            "members": len(members),
+        })
+
+    # Outliers: small, less confident clusters next to a real table
+    largest = max(clusters, key=lambda c: _area(c['bbox']))
+    clusters = [
+        c for c in clusters
+        if c is largest or _area(c['bbox']) >= min_area_ratio * _area(largest['bbox']) or c['conf'] >= largest['conf']
+    ]
+    return sorted(clusters, key=lambda c: (c['bbox'][1], c['bbox'][0]))
+
+def merge_tables(tables, rows_key="table_rows"):
+    """
+    Combines the Donut outputs of a page's separate tables: rows are
+    concatenated in reading order, any other field comes from the first
+    table that has it.
+    """
+    if len(tables) == 1:
+        return tables[0]
+    merged = {}
+    rows = []
+    for table in tables:
+        table_rows = table.get(rows_key, [])
+        rows.extend([table_rows] if isinstance(table_rows, dict) else table_rows)
+        for key, value in table.items():
+            if key != rows_key and key not in merged:
+                merged[key] = value
+    if rows:
+        merged[rows_key] = rows
+    return merged
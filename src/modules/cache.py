@@ -0,0 +1,171 @@
+from pathlib import Path
+from PIL import Image
+import numpy as np
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Files larger than this are fingerprinted by size + head/tail instead of fully hashed
+LARGE_FILE_BYTES = 64 * 1024 * 1024
+EDGE_BYTES = 1024 * 1024
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_hash(source):
+    """
+    Input: Image path, raw encoded bytes, PIL Image, numpy array or PageImage
+    Output: Hex digest of the content (file names play no part)
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hash_bytes(bytes(source))
+    if hasattr(source, "rgb"):
+        source = source.rgb
+    if isinstance(source, np.ndarray):
+        digest = hashlib.sha256(f"{source.dtype}:{source.shape}".encode())
+        digest.update(np.ascontiguousarray(source).data)
+        return digest.hexdigest()
+    if isinstance(source, Image.Image):
+        digest = hashlib.sha256(f"{source.mode}:{source.size}".encode())
+        digest.update(source.tobytes())
+        return digest.hexdigest()
+    return hash_file(source)
+
+def model_revision(path, exclude=()):
+    """
+    Fingerprint of a weights file or a model directory (e.g. the Donut folder).
+    Multi-GB weight files are summarised by size plus their first and last MB.
+    exclude: Names of subdirectories to leave out (derived artifacts such as exports)
+    """
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(p for p in path.rglob("*") if p.is_file() and p.relative_to(path).parts[0] not in exclude)
+    else:
+        files = [path]
+
+    digest = hashlib.sha256()
+    for file in files:
+        size = file.stat().st_size
+        digest.update(f"{file.relative_to(path) if path.is_dir() else file.name}:{size}".encode())
+        if size <= LARGE_FILE_BYTES:
+            digest.update(hash_file(file).encode())
+        else:
+            with open(file, "rb") as f:
+                digest.update(f.read(EDGE_BYTES))
+                f.seek(-EDGE_BYTES, 2)
+                digest.update(f.read(EDGE_BYTES))
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    On-disk LRU cache of pipeline results, backed by SQLite.
+
+    Several worker processes can share one cache file: SQLite's WAL mode and
+    busy timeout serialise writers, and hit/miss counters live in the file
+    so they add up across processes.
+    """
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, namespace=""):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        # Model and parameter fingerprint, mixed into every key
+        self.namespace = namespace
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, content_digest):
+        return hash_bytes(f"{self.namespace}:{content_digest}".encode())
+
+    def get(self, key):
+        """
+        Output: The cached result dict, or None on a miss
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self._bump("misses")
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._bump("hits")
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        blob = json.dumps(value).encode("utf-8")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time())
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            totals = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def close(self):
+        self._conn.close()
+
+    def _bump(self, name):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def _evict(self):
+        # Drop least recently used entries until the cache fits again
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
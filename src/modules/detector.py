@@ -1,20 +1,39 @@
-from ultralytics import YOLO
-from PIL import Image
+from src.modules.onnx_backend import export_detector
 import numpy as np
 
 class TableDetector:
-    def __init__(self, model_path, device="cuda"):
+    def __init__(self, model_path, device="cuda", backend="torch"):
+        if backend == "onnx":
+            # Exported once next to the weights, then run by ONNX Runtime
+            model_path = export_detector(model_path)
         print(f"[Detector] Loading YOLOv8 from {model_path}...")
-        self.model = YOLO(model_path)
+        # Deferred so importing this module stays cheap
+        from ultralytics import YOLO
+        self.model = YOLO(model_path, task="detect")
         self.device = device
+        self.backend = backend
 
-    def detect(self, image: Image.Image, conf=0.1):
+    def detect(self, image, conf=0.1, imgsz=None):
         """
+        Input: PIL Image, or numpy array in BGR order (the Ultralytics convention)
+               imgsz: network input size (defaults to the size the model was trained at)
         Returns: List of detected objects with metadata
         """
-        results = self.model(image, conf=conf, verbose=False)
-        result = results[0]
-        
+        return self.detect_batch([image], conf=conf, imgsz=imgsz)[0]
+
+    def detect_batch(self, images, conf=0.1, imgsz=None):
+        """
+        Input: List of PIL Images or BGR numpy arrays
+        Output: One detection list per image, in input order
+        """
+        options = {"conf": conf, "verbose": False}
+        if imgsz:
+            options["imgsz"] = imgsz
+        # A list source runs as a single batched forward pass
+        results = self.model(list(images), **options)
+        return [self._to_detections(result) for result in results]
+
+    def _to_detections(self, result):
         detections = []
         for box in result.boxes:
             coords = map(int, box.xyxy[0].cpu().numpy())
@@ -23,4 +42,27 @@ class TableDetector:
                 "conf": float(box.conf[0]),
                 "bbox": list(coords) # [x1, y1, x2, y2]
             })
-        return detections
\ No newline at end of file
+        return detections
+
+def network_size(max_side):
+    """
+    YOLO input sizes must be multiples of the model stride (32).
+    """
+    return None if not max_side else max(32, -(-int(max_side) // 32) * 32)
+
+def scale_detections(detections, scale, size):
+    """
+    Maps boxes found on a downscaled page back to the original page.
+    Input: scale (sx, sy) from PageImage.detection_view, size = original (width, height)
+    """
+    sx, sy = scale
+    if (sx, sy) == (1.0, 1.0):
+        return detections
+    width, height = size
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        det['bbox'] = [
+            max(0, int(x1 * sx)), max(0, int(y1 * sy)),
+            min(width, int(round(x2 * sx))), min(height, int(round(y2 * sy)))
+        ]
+    return detections
\ No newline at end of file
@@ -0,0 +1,163 @@
+from collections import deque
+import re
+
+TAG_PATTERN = re.compile(r"<(/?)([a-zA-Z0-9_]+)>")
+
+# A "<" with no ">" after it longer than this is plain text, not a partial tag
+MAX_TAG_LENGTH = 64
+
+class DonutTagParser:
+    """
+    Single-pass parser for Donut's <key>value</key> output.
+
+    Text can be fed in pieces (e.g. one token at a time while generating);
+    every character is looked at once. For well-formed sequences the result
+    matches the original regex-based token2json: nested values become dicts,
+    repeated nested keys become lists and repeated leaf keys keep the last value.
+    """
+    def __init__(self):
+        self.root = {}
+        self.closed_keys = set()   # top-level keys closed at least once
+        self.trailing_text = False # text seen outside any tag after a top-level close
+        self._stack = []           # open tags: [key, children, text parts, has_children]
+        self._buffer = ""
+
+    @property
+    def depth(self):
+        return len(self._stack)
+
+    def feed(self, text):
+        data = self._buffer + text
+        pos = 0
+        for match in TAG_PATTERN.finditer(data):
+            self._text(data[pos:match.start()])
+            pos = match.end()
+            closing, key = match.groups()
+            if closing:
+                self._close(key)
+            else:
+                self._stack.append([key, {}, [], False])
+
+        # Hold back a tag that may be split across two pieces
+        rest = data[pos:]
+        cut = rest.rfind("<")
+        if cut != -1 and ">" not in rest[cut:] and len(rest) - cut <= MAX_TAG_LENGTH:
+            self._text(rest[:cut])
+            self._buffer = rest[cut:]
+        else:
+            self._text(rest)
+            self._buffer = ""
+        return self
+
+    def close_all(self):
+        """
+        Closes every tag left open, e.g. after generation was cut short.
+        """
+        while self._stack:
+            self._close(self._stack[-1][0])
+        return self.root
+
+    def _text(self, text):
+        if not text:
+            return
+        if self._stack:
+            self._stack[-1][2].append(text)
+        elif self.closed_keys and text.strip():
+            self.trailing_text = True
+
+    def _close(self, key):
+        # A close tag with no matching open tag is ignored
+        if not any(frame[0] == key for frame in self._stack):
+            return
+
+        # Unclosed tags inside the one being closed are dropped
+        while self._stack[-1][0] != key:
+            self._stack.pop()
+
+        _, children, parts, has_children = self._stack.pop()
+        if self._stack:
+            parent = self._stack[-1]
+            parent[3] = True
+            parent = parent[1]
+        else:
+            parent = self.root
+            self.closed_keys.add(key)
+
+        if has_children:
+            if key in parent:
+                if not isinstance(parent[key], list): parent[key] = [parent[key]]
+                parent[key].append(children)
+            else:
+                parent[key] = children
+        else:
+            parent[key] = "".join(parts).strip()
+
+class DonutStopper:
+    """
+    Stopping criterion for model.generate that parses tokens as they arrive.
+
+    A sequence is finished once its top-level structure has closed, every
+    expected key is present and the model starts emitting text outside any
+    tag (or one of the terminal keys closes). It is also stopped when the
+    last tokens are the same short block repeated over and over.
+    """
+    def __init__(self, tokenizer, prompt_length, expected_keys=(), terminal_keys=(),
+                 max_period=12, min_repeats=6):
+        self.tokenizer = tokenizer
+        self.expected_keys = set(expected_keys)
+        self.terminal_keys = set(terminal_keys)
+        self.max_period = max_period
+        self.min_repeats = min_repeats
+
+        self._seen = prompt_length
+        self._skip = {tokenizer.pad_token_id, tokenizer.eos_token_id}
+        self.parsers = []
+        self.reasons = []
+        self._history = []
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        batch_size = input_ids.shape[0]
+        if not self.parsers:
+            self.parsers = [DonutTagParser() for _ in range(batch_size)]
+            self.reasons = [None] * batch_size
+            self._history = [deque(maxlen=self.max_period * self.min_repeats) for _ in range(batch_size)]
+
+        new_ids = input_ids[:, self._seen:].tolist()
+        self._seen = input_ids.shape[1]
+
+        for row, ids in enumerate(new_ids):
+            if self.reasons[row] is not None:
+                continue
+            ids = [i for i in ids if i not in self._skip]
+            parser = self.parsers[row]
+            for token in self.tokenizer.convert_ids_to_tokens(ids):
+                parser.feed(token.replace("▁", " "))
+            self._history[row].extend(ids)
+            self.reasons[row] = self._reason(parser, self._history[row])
+
+        return torch.tensor([reason is not None for reason in self.reasons], dtype=torch.bool, device=input_ids.device)
+
+    def _reason(self, parser, history):
+        if parser.depth == 0 and self.expected_keys <= parser.closed_keys:
+            if parser.closed_keys & self.terminal_keys:
+                return "complete"
+            if parser.closed_keys and parser.trailing_text:
+                return "complete"
+        if self._repeating(history):
+            return "repetition"
+        return None
+
+    def _repeating(self, history):
+        if len(history) < self.min_repeats:
+            return False
+        tail = list(history)
+        for period in range(1, self.max_period + 1):
+            span = period * self.min_repeats
+            if span > len(tail):
+                break
+            window = tail[-span:]
+            if all(window[i] == window[i % period] for i in range(period, span)):
+                return True
+        return False
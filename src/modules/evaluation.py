@@ -0,0 +1,50 @@
+from pathlib import Path
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def load_yolo_labels(label_path, size):
+    """
+    Input: YOLO label file (class cx cy w h, normalised) and the image (width, height)
+    Output: List of {"class_id", "bbox"} in pixel coordinates
+    """
+    label_path = Path(label_path)
+    if not label_path.exists():
+        return []
+    width, height = size
+    boxes = []
+    for line in label_path.read_text().splitlines():
+        parts = line.split()
+        if len(parts) != 5:
+            continue
+        cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:])
+        boxes.append({
+            "class_id": cls,
+            "bbox": [(cx - w / 2) * width, (cy - h / 2) * height, (cx + w / 2) * width, (cy + h / 2) * height],
+        })
+    return boxes
+
+def match_detections(truth, detections, min_iou=0.5):
+    """
+    Greedy same-class matching, highest IoU first.
+    Output: {"tp", "fp", "fn", "ious"} where ious lists the IoU of every match
+    """
+    pairs = sorted(
+        ((iou(t['bbox'], d['bbox']), ti, di)
+         for ti, t in enumerate(truth)
+         for di, d in enumerate(detections)
+         if t['class_id'] == d['class_id']),
+        reverse=True,
+    )
+    used_t, used_d, ious = set(), set(), []
+    for score, ti, di in pairs:
+        if score < min_iou or ti in used_t or di in used_d:
+            continue
+        used_t.add(ti)
+        used_d.add(di)
+        ious.append(score)
+    return {"tp": len(ious), "fp": len(detections) - len(ious), "fn": len(truth) - len(ious), "ious": ious}
@@ -0,0 +1,245 @@
+"""
+Streaming result sink: one flat record per table row, written as pages finish.
+
+Layout of an export directory:
+    records.jsonl            append-only, one record per line (the log)
+    part-00000.parquet ...   optional columnar copy, rotated every rows_per_part rows
+    documents.log            one committed source per line
+    manifest.json            byte offsets / closed parts at the last commit
+
+A document is committed once all its records are written. On reopen, the
+files are cut back to the last commit, and the Parquet part that was still
+open is rebuilt from the JSONL log, so an interrupted export resumes
+without duplicates or gaps.
+"""
+from pathlib import Path
+import json
+import os
+
+SCHEMA_VERSION = 1
+
+# Stage timings get a fixed column each so the schema never changes with the run
+STAGE_COLUMNS = ("render", "decode", "orient", "detect", "route", "text_layer", "ocr", "extract")
+
+COLUMNS = (
+    ("source", "string"),
+    ("page", "int32"),
+    ("po_number", "string"),
+    ("path", "string"),
+    ("row_index", "int32"),
+    ("row", "string"),          # the table row as JSON (its keys vary by vendor)
+    ("error", "string"),
+    ("page_seconds", "float64"),
+) + tuple((f"{stage}_seconds", "float64") for stage in STAGE_COLUMNS)
+
+def flatten(source, page, result, seconds=None):
+    """
+    Input: One page result dict
+    Output: List of flat records, one per table row (one record with
+            row_index None when the page has no rows)
+    """
+    stages = result.get("metrics", {}).get("stages", {})
+    base = {
+        "source": source,
+        "page": page,
+        "po_number": result.get("po_number"),
+        "path": result.get("path"),
+        "error": result.get("error"),
+        "page_seconds": seconds,
+        **{f"{stage}_seconds": stages.get(stage) for stage in STAGE_COLUMNS},
+    }
+    rows = result.get("table_rows", [])
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows:
+        rows = [None]
+    # Records keep the column order of COLUMNS
+    return [
+        {name: base.get(name) for name, _ in COLUMNS} | {
+            "row_index": None if row is None else n,
+            "row": None if row is None else json.dumps(row, ensure_ascii=False),
+        }
+        for n, row in enumerate(rows)
+    ]
+
+def _write_json(path, data):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+class ResultSink:
+    """
+    Input: directory, parquet (also write Parquet; needs pyarrow),
+           row_group_size (records buffered before a row group is flushed),
+           rows_per_part (records per Parquet file before rotating)
+    Memory use is bounded by row_group_size records plus the set of
+    committed source names.
+    """
+    def __init__(self, directory, parquet=False, row_group_size=50_000, rows_per_part=5_000_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.row_group_size = row_group_size
+        self.rows_per_part = rows_per_part
+
+        self._pa = self._pq = None
+        if parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Parquet export needs pyarrow (pip install pyarrow)") from e
+            self._pa, self._pq = pa, pq
+            self._schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in COLUMNS])
+
+        self.jsonl_path = self.directory / "records.jsonl"
+        self.documents_path = self.directory / "documents.log"
+        self.manifest_path = self.directory / "manifest.json"
+
+        self.manifest = self._recover()
+        self._jsonl = open(self.jsonl_path, "ab")
+        self._documents = open(self.documents_path, "ab")
+        self._buffer = []
+        self._writer = None
+        self._part_rows = 0
+        # Log offset just past the last record written to the open part
+        self._flushed_end = self.manifest["parquet"]["jsonl_bytes"]
+
+        # Parquet records that are in the log but not in a closed part (the
+        # part open at the last commit): replay them into a fresh part
+        if self._pa is not None:
+            self._replay(self.manifest["parquet"]["jsonl_bytes"])
+
+    # --- PUBLIC API ---
+    def completed(self):
+        """
+        Output: Set of committed sources that did not fail
+        """
+        return set(self._completed)
+
+    def write_document(self, source, pages, error=None):
+        """
+        Writes and commits all records of one document.
+        Input: pages = [(page number, result dict, seconds or None), ...]
+        A document that already committed successfully is skipped.
+        Output: Number of records written
+        """
+        if source in self._completed:
+            return 0
+
+        records = []
+        for page, result, seconds in pages:
+            records.extend(flatten(source, page, result, seconds))
+        if error is not None or not records:
+            records.append({**flatten(source, None, {"error": error or "No pages"})[0]})
+
+        lines = [(json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8") for r in records]
+        end = self._jsonl.tell()
+        self._jsonl.write(b"".join(lines))
+        if self._pa is not None:
+            for record, line in zip(records, lines):
+                end += len(line)
+                self._add_parquet(record, end)
+
+        failed = error is not None
+        self._documents.write((json.dumps({"source": source, "failed": failed}) + "\n").encode("utf-8"))
+        if not failed:
+            self._completed.add(source)
+        self._commit()
+        return len(records)
+
+    def close(self):
+        if self._pa is not None:
+            self._flush_row_group()
+            self._close_part()
+            self._commit()
+        self._jsonl.close()
+        self._documents.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- COMMIT / RECOVERY ---
+    def _commit(self):
+        self._jsonl.flush()
+        self._documents.flush()
+        os.fsync(self._jsonl.fileno())
+        self.manifest["jsonl_bytes"] = self._jsonl.tell()
+        self.manifest["documents_bytes"] = self._documents.tell()
+        _write_json(self.manifest_path, self.manifest)
+
+    def _recover(self):
+        manifest = {
+            "schema_version": SCHEMA_VERSION,
+            "columns": [name for name, _ in COLUMNS],
+            "jsonl_bytes": 0,
+            "documents_bytes": 0,
+            "parquet": {"parts": [], "jsonl_bytes": 0},
+        }
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+            if manifest.get("schema_version") != SCHEMA_VERSION:
+                raise ValueError(f"{self.directory} was written with a different export schema")
+
+        # Anything after the last commit is a partial write
+        for path, key in ((self.jsonl_path, "jsonl_bytes"), (self.documents_path, "documents_bytes")):
+            if path.exists():
+                with open(path, "r+b") as f:
+                    f.truncate(manifest[key])
+
+        # A part that was never closed has no footer; it is rebuilt from the log
+        closed = {part["file"] for part in manifest["parquet"]["parts"]}
+        for part in self.directory.glob("part-*.parquet"):
+            if part.name not in closed:
+                part.unlink()
+
+        self._completed = set()
+        if self.documents_path.exists():
+            with open(self.documents_path, "rb") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if not entry["failed"]:
+                        self._completed.add(entry["source"])
+        return manifest
+
+    def _replay(self, offset):
+        with open(self.jsonl_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                self._add_parquet(json.loads(line), offset)
+
+    # --- PARQUET ---
+    def _add_parquet(self, record, end):
+        self._buffer.append(record)
+        self._buffer_end = end
+        if len(self._buffer) >= self.row_group_size:
+            self._flush_row_group()
+
+    def _flush_row_group(self):
+        if not self._buffer:
+            return
+        if self._writer is None:
+            name = f"part-{len(self.manifest['parquet']['parts']):05d}.parquet"
+            self._writer = self._pq.ParquetWriter(self.directory / name, self._schema)
+            self._part_name = name
+        columns = {name: [r.get(name) for r in self._buffer] for name, _ in COLUMNS}
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+        self._part_rows += len(self._buffer)
+        self._flushed_end = self._buffer_end
+        self._buffer = []
+        if self._part_rows >= self.rows_per_part:
+            self._close_part()
+
+    def _close_part(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        parquet = self.manifest["parquet"]
+        parquet["parts"].append({"file": self._part_name, "rows": self._part_rows})
+        # Recovery replays the log into a new part from here
+        parquet["jsonl_bytes"] = self._flushed_end
+        self._part_rows = 0
@@ -1,33 +1,105 @@
-from transformers import DonutProcessor, VisionEncoderDecoderModel
-import torch
+from src.modules.donut_parser import DonutTagParser, DonutStopper
+from src.modules.onnx_backend import export_extractor
+from src.modules.tiling import input_aspect
+from pathlib import Path
+import json
 import re
+import time
+
+# An opening tag, named the way DonutTagParser keys it
+FIELD_TAG = re.compile(r"^<([a-zA-Z0-9_]+)>$")
+
+def _fields_from_tokens(tokens):
+    return tuple(sorted({m.group(1) for m in map(FIELD_TAG.match, tokens) if m}))
+
+def schema_fields(model_path):
+    """
+    Field names the Donut model was trained on (its added tag tokens), read
+    from the tokenizer files so the model itself doesn't have to load.
+    Output: Sorted tuple of names (empty if the files hold none)
+    """
+    model_path = Path(model_path)
+    added = model_path / "added_tokens.json"
+    if added.exists():
+        return _fields_from_tokens(json.loads(added.read_text()))
+    tokenizer = model_path / "tokenizer.json"
+    if tokenizer.exists():
+        return _fields_from_tokens(t["content"] for t in json.loads(tokenizer.read_text()).get("added_tokens", []))
+    return ()
 
 class TableParser:
-    def __init__(self, model_path, device="cuda"):
+    def __init__(self, model_path, device="cuda", expected_keys=("table_rows",), backend="torch"):
         print(f"[Extractor] Loading Donut from {model_path}...")
+        # Deferred so importing this module stays cheap
+        import torch
+        from transformers import DonutProcessor, VisionEncoderDecoderModel
         self.processor = DonutProcessor.from_pretrained(model_path)
-        # Half precision for 8GB GPU
-        self.model = VisionEncoderDecoderModel.from_pretrained(
-            model_path, 
-            torch_dtype=torch.float16
-        )
-        self.model.to(device)
+
+        if backend == "onnx":
+            # Encoder/decoder with INT8 MatMul/Gemm weights on ONNX Runtime (CPU)
+            from optimum.onnxruntime import ORTModelForVision2Seq
+            self.model = ORTModelForVision2Seq.from_pretrained(export_extractor(model_path))
+            self.dtype = torch.float32
+            device = "cpu"
+        else:
+            # Half precision for 8GB GPU; fp16 is slow or unsupported on CPU
+            self.dtype = torch.float16 if str(device).startswith("cuda") else torch.float32
+            self.model = VisionEncoderDecoderModel.from_pretrained(
+                model_path, 
+                torch_dtype=self.dtype
+            )
+            self.model.to(device)
         self.device = device
+        self.backend = backend
+        # Top-level keys a finished sequence must contain before stopping early
+        self.expected_keys = tuple(expected_keys)
+
+    @property
+    def field_names(self):
+        """
+        Output: Field names of the model's output schema (see schema_fields)
+        """
+        return _fields_from_tokens(self.processor.tokenizer.get_added_vocab())
+
+    @property
+    def input_aspect(self):
+        """
+        Output: Height / width of the encoder input (row bands are cut to this shape)
+        """
+        return input_aspect(self.processor.image_processor.size)
 
     def extract_table(self, image_crop):
         """
-        Input: PIL Image of just the table
+        Input: PIL Image (or RGB numpy array) of just the table
         Output: JSON Dict
         """
-        pixel_values = self.processor(image_crop, return_tensors="pt").pixel_values
-        pixel_values = pixel_values.to(self.device).half()
+        return self.extract_tables([image_crop])[0]
+
+    def extract_tables(self, image_crops, stats=None):
+        """
+        Input: List of PIL Images or RGB numpy arrays (table crops)
+        Output: One JSON Dict per crop, in input order
+        stats: Optional dict, filled with generated token counts and timings
+        """
+        if not image_crops:
+            return []
+
+        # The processor resizes and pads every crop to the encoder input size,
+        # so crops of different shapes stack into one batch
+        pixel_values = self.processor(list(image_crops), return_tensors="pt").pixel_values
+        pixel_values = pixel_values.to(self.device, dtype=self.dtype)
         
-        # Prepare Prompt (Start Token)
+        # Prepare Prompt (Start Token), one per crop
         task_prompt = "<s>"
         decoder_input_ids = self.processor.tokenizer(task_prompt, add_special_tokens=False, return_tensors="pt").input_ids
-        decoder_input_ids = decoder_input_ids.to(self.device)
+        decoder_input_ids = decoder_input_ids.repeat(len(image_crops), 1).to(self.device)
+        
+        # Parse while generating, so finished or looping sequences stop early
+        from transformers import StoppingCriteriaList
+        stopper = DonutStopper(self.processor.tokenizer, decoder_input_ids.shape[1], expected_keys=self.expected_keys)
         
         # Generate
+        start = time.perf_counter()
         outputs = self.model.generate(
             pixel_values,
             decoder_input_ids=decoder_input_ids,
@@ -39,44 +111,34 @@ class TableParser:
             num_beams=1,
             bad_words_ids=[[self.processor.tokenizer.unk_token_id]],
             return_dict_in_generate=True,
-            repetition_penalty=1.2
+            repetition_penalty=1.2,
+            stopping_criteria=StoppingCriteriaList([stopper])
         )
         
-        # Decode
-        seq = self.processor.batch_decode(outputs.sequences)[0]
+        generate_seconds = time.perf_counter() - start
+        
+        # Decode (a sequence cut off in a loop keeps what it closed so far)
+        start = time.perf_counter()
+        sequences = self.processor.batch_decode(outputs.sequences)
+        reasons = stopper.reasons or [None] * len(sequences)
+        tables = [self._to_json(seq, truncated=reason == "repetition") for seq, reason in zip(sequences, reasons)]
+        
+        if stats is not None:
+            generated = outputs.sequences[:, decoder_input_ids.shape[1]:]
+            stats["tokens"] = (generated != self.processor.tokenizer.pad_token_id).sum(dim=1).tolist()
+            stats["generate_seconds"] = generate_seconds
+            stats["parse_seconds"] = time.perf_counter() - start
+            stats["stop_reasons"] = list(reasons)
+        return tables
+
+    def _to_json(self, seq, truncated=False):
         seq = seq.replace(self.processor.tokenizer.eos_token, "").replace(self.processor.tokenizer.pad_token, "")
         seq = re.sub(r"<.*?>", "", seq, count=1).strip()
         
+        if truncated:
+            return DonutTagParser().feed(seq).close_all()
         return self._token2json(seq)
 
     def _token2json(self, tokens, is_inner_value=False):
-        # (Standard Donut JSON parsing logic)
-        output = {}
-        while tokens:
-            start_token = re.search(r"<([a-zA-Z0-9_]+)>", tokens)
-            if start_token:
-                key = start_token.group(1)
-                end_token = re.search(f"</{key}>", tokens)
-                if end_token:
-                    start_index = start_token.end()
-                    end_index = end_token.start()
-                    value = tokens[start_index:end_index].strip()
-                    if re.search(r"<.*?>", value):
-                        value = self._token2json(value, is_inner_value=True)
-                        if isinstance(value, list):
-                            if key not in output: output[key] = []
-                            output[key].extend(value)
-                        else:
-                            if key in output:
-                                if not isinstance(output[key], list): output[key] = [output[key]]
-                                output[key].append(value)
-                            else:
-                                output[key] = value
-                    else:
-                        output[key] = value
-                    tokens = tokens[end_token.end():]
-                else:
-                    tokens = ""
-            else:
-                tokens = ""
-        return output
\ No newline at end of file
+        # (Standard Donut JSON parsing logic, in a single pass)
+        return DonutTagParser().feed(tokens).root
@@ -0,0 +1,177 @@
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from src.modules.cache import hash_bytes
+from src.modules.pages import DEFAULT_DPI, count_pages, iter_pdf_pages
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+def _write_json(path, data):
+    # Write-then-rename so a reader never sees half a file
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+class JobQueue:
+    """
+    Background PDF processing shared by every session of the app.
+
+    Documents are queued with submit() and processed by worker threads on the
+    shared pipeline. Each page's result is written to disk as soon as it is
+    done, under store_dir/<job id>/, where the job id is the content hash
+    plus the DPI. Resubmitting the same document (a rerun, a reconnect, a
+    restart) picks up the stored results instead of processing it again.
+    A failed job stays failed until retry() is called for it.
+
+    With a BatchingService, pages are sent through it one at a time, so
+    the pages of documents processed by different workers share batches.
+    """
+    def __init__(self, pipeline, store_dir, workers=1, service=None):
+        self.pipeline = pipeline
+        self.service = service
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._status = {}
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+            for n in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, name, pdf_bytes, dpi=DEFAULT_DPI):
+        """
+        Output: Job id. Nothing is queued if the job already exists (queued,
+        running, done or failed). A PDF that can't be opened gives a failed job.
+        """
+        job_id = f"{hash_bytes(pdf_bytes)[:16]}-{dpi}"
+        with self._lock:
+            status = self._status.get(job_id) or self._load_status(job_id)
+            if status is not None:
+                self._status[job_id] = status
+                return job_id
+
+            job_dir = self.store_dir / job_id
+            job_dir.mkdir(exist_ok=True)
+            (job_dir / "document.pdf").write_bytes(pdf_bytes)
+            status = {"id": job_id, "name": name, "dpi": dpi, "submitted": time.time()}
+            queued = self._reset(status, pdf_bytes)
+        if queued:
+            self._queue.put(job_id)
+        return job_id
+
+    def retry(self, job_id):
+        """
+        Queues a failed job again, dropping the pages it had finished.
+        Output: True if the job was queued
+        """
+        with self._lock:
+            status = self._status.get(job_id) or self._load_status(job_id)
+            if status is None or status["state"] != FAILED:
+                return False
+            for path in (self.store_dir / job_id).glob("page_*.json"):
+                path.unlink()
+            queued = self._reset(status, self.document(job_id))
+        if queued:
+            self._queue.put(job_id)
+        return queued
+
+    def status(self, job_id):
+        with self._lock:
+            status = self._status.get(job_id) or self._load_status(job_id)
+            return dict(status) if status else None
+
+    def results(self, job_id):
+        """
+        Output: {page number: result dict} for every page finished so far
+        """
+        pages = {}
+        for path in (self.store_dir / job_id).glob("page_*.json"):
+            pages[int(path.stem.split("_")[1])] = json.loads(path.read_text())
+        return dict(sorted(pages.items()))
+
+    def document(self, job_id):
+        return (self.store_dir / job_id / "document.pdf").read_bytes()
+
+    def active(self):
+        """
+        Output: Number of jobs queued or running
+        """
+        with self._lock:
+            return sum(1 for s in self._status.values() if s["state"] in (QUEUED, RUNNING))
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        job_dir = self.store_dir / job_id
+        with self._lock:
+            status = self._status[job_id]
+            status["state"] = RUNNING
+            self._save(status)
+
+        try:
+            pdf_bytes = (job_dir / "document.pdf").read_bytes()
+            if self.service is None:
+                pages = self.pipeline.process_pdf(pdf_bytes, dpi=status["dpi"])
+            else:
+                pages = self._process_via_service(pdf_bytes, status["dpi"])
+            for page_number, result in pages:
+                _write_json(job_dir / f"page_{page_number}.json", result)
+                with self._lock:
+                    status["done"] = page_number
+                    self._save(status)
+            final = {"state": DONE}
+        except Exception as e:
+            final = {"state": FAILED, "error": str(e)}
+
+        with self._lock:
+            status.update(final)
+            self._save(status)
+
+    def _process_via_service(self, pdf_bytes, dpi):
+        text_layers = self.pipeline.read_text_layers(pdf_bytes)
+        for page_number, image in iter_pdf_pages(pdf_bytes, dpi=dpi):
+            result = self.service.submit(image, text_layers.get(page_number)).result()
+            result['page'] = page_number
+            yield page_number, result
+
+    def _reset(self, status, pdf_bytes):
+        # Caller holds the lock. Output: True if the job is ready to be queued
+        try:
+            total, state, error = count_pages(pdf_bytes), QUEUED, None
+        except Exception as e:
+            total, state, error = 0, FAILED, f"Could not read PDF: {e}"
+        status.update({"state": state, "total": total, "done": 0, "error": error})
+        self._save(status)
+        return state == QUEUED
+
+    def _save(self, status):
+        self._status[status["id"]] = status
+        _write_json(self.store_dir / status["id"] / "status.json", status)
+
+    def _load_status(self, job_id):
+        path = self.store_dir / job_id / "status.json"
+        if not path.exists():
+            return None
+        status = json.loads(path.read_text())
+        # A job that was queued or running when the process stopped starts over
+        if status["state"] in (QUEUED, RUNNING) and job_id not in self._status:
+            return None
+        return status
@@ -0,0 +1,182 @@
+"""
+Layout fingerprints for recurring vendor templates.
+
+A page's fingerprint is a 256-bit difference hash of a 16x16 thumbnail plus
+its row and column ink profiles. Pages from the same template land within a
+few bits of each other even across scans, so their PO and table boxes can be
+reused instead of running YOLO.
+"""
+from pathlib import Path
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from src.modules.evaluation import iou
+
+HASH_SIZE = 16
+PROFILE_SIZE = 64
+
+class Fingerprint:
+    def __init__(self, dhash, profile, aspect):
+        self.dhash = dhash
+        self.profile = profile
+        self.aspect = aspect
+
+def fingerprint(page_image):
+    """
+    Input: PageImage
+    Output: Fingerprint
+    """
+    gray = cv2.cvtColor(page_image.rgb, cv2.COLOR_RGB2GRAY)
+
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    dhash = int("".join("1" if b else "0" for b in bits), 2)
+
+    ink = 255.0 - cv2.resize(gray, (PROFILE_SIZE, PROFILE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    profile = np.concatenate([ink.mean(axis=1), ink.mean(axis=0)])
+    profile -= profile.mean()
+    norm = np.linalg.norm(profile)
+    profile = profile / norm if norm > 0 else profile
+
+    return Fingerprint(dhash, profile, page_image.width / page_image.height)
+
+class LayoutIndex:
+    """
+    Known templates -> normalised PO / table boxes, persisted as JSON.
+
+    max_distance: Hamming distance (of 256 bits) for a candidate match
+    min_correlation: profile correlation a candidate must also reach
+    min_conf: only detections at least this confident are learned
+    verify: on a match, still run YOLO at verify_size and only trust the
+            template when the boxes agree (min_iou)
+    """
+    def __init__(self, path=None, max_distance=24, min_correlation=0.9, min_conf=0.6,
+                 verify=False, verify_size=640, min_iou=0.7):
+        self.path = Path(path) if path else None
+        self.max_distance = max_distance
+        self.min_correlation = min_correlation
+        self.min_conf = min_conf
+        self.verify = verify
+        self.verify_size = verify_size
+        self.min_iou = min_iou
+
+        self._lock = threading.Lock()
+        self.templates = []
+        self.counters = {"lookups": 0, "hits": 0, "learned": 0, "verified": 0, "rejected": 0}
+        if self.path and self.path.exists():
+            self._load()
+
+    def match(self, fp):
+        """
+        Output: Best matching template dict, or None. It only counts as a
+        hit once its boxes are taken with use() (after verification, if any).
+        """
+        with self._lock:
+            self.counters["lookups"] += 1
+            return self._find(fp)
+
+    def use(self, template, size):
+        """
+        Output: The template's boxes for a page of size (width, height), counted as a hit
+        """
+        with self._lock:
+            self.counters["hits"] += 1
+            template["hits"] += 1
+        return self.detections(template, size)
+
+    def _find(self, fp):
+        best, best_distance = None, self.max_distance + 1
+        for template in self.templates:
+            if abs(template["aspect"] - fp.aspect) > 0.05 * fp.aspect:
+                continue
+            distance = (template["dhash"] ^ fp.dhash).bit_count()
+            if distance < best_distance and float(template["profile"] @ fp.profile) >= self.min_correlation:
+                best, best_distance = template, distance
+        return best
+
+    def detections(self, template, size):
+        """
+        Output: The template's boxes as detections for a page of size (width, height)
+        """
+        width, height = size
+        return [{
+            "class_id": box["class_id"],
+            "conf": box["conf"],
+            "bbox": [int(box["bbox"][0] * width), int(box["bbox"][1] * height),
+                     int(round(box["bbox"][2] * width)), int(round(box["bbox"][3] * height))],
+        } for box in template["boxes"]]
+
+    def agrees(self, template, detections, size):
+        """
+        Verification: every template box has a same-class detection overlapping it.
+        """
+        expected = self.detections(template, size)
+        ok = all(
+            max((iou(e["bbox"], d["bbox"]) for d in detections if d["class_id"] == e["class_id"]), default=0.0)
+            >= self.min_iou
+            for e in expected
+        )
+        with self._lock:
+            self.counters["verified" if ok else "rejected"] += 1
+        return ok
+
+    def learn(self, fp, detections, size):
+        """
+        Adds a template from a page's confident PO and table boxes; the
+        low-confidence rest (stray hits at the detector's low threshold) is
+        left out. Needs at least one confident box of each class.
+        Output: True if learned.
+        """
+        detections = [d for d in detections if d["class_id"] in (0, 1) and d["conf"] >= self.min_conf]
+        if not {0, 1} <= {d["class_id"] for d in detections}:
+            return False
+
+        width, height = size
+        template = {
+            "dhash": fp.dhash,
+            "profile": fp.profile,
+            "aspect": fp.aspect,
+            "boxes": [{
+                "class_id": d["class_id"],
+                "conf": round(float(d["conf"]), 3),
+                "bbox": [d["bbox"][0] / width, d["bbox"][1] / height, d["bbox"][2] / width, d["bbox"][3] / height],
+            } for d in detections],
+            "hits": 0,
+        }
+        with self._lock:
+            # Another page of the same batch may have taught it already
+            if self._find(fp) is not None:
+                return False
+            self.templates.append(template)
+            self.counters["learned"] += 1
+        self.save()
+        return True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["lookups"]
+            return {
+                "templates": len(self.templates),
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = [{**t, "dhash": f"{t['dhash']:064x}", "profile": [round(float(v), 5) for v in t["profile"]]}
+                    for t in self.templates]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"templates": data}))
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        data = json.loads(self.path.read_text())
+        for t in data["templates"]:
+            self.templates.append({**t, "dhash": int(t["dhash"], 16), "profile": np.asarray(t["profile"], dtype=np.float32)})
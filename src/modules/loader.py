@@ -0,0 +1,119 @@
+from pathlib import Path
+from PIL import Image
+import numpy as np
+import cv2
+import io
+
+class PageImage:
+    """
+    A page decoded exactly once, held as a contiguous RGB array.
+
+    The BGR view for OpenCV/Paddle, the PIL view and all crops share the same
+    buffer instead of copying it.
+    """
+    def __init__(self, rgb: np.ndarray):
+        self.rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        self._pil = None
+
+    @property
+    def width(self):
+        return self.rgb.shape[1]
+
+    @property
+    def height(self):
+        return self.rgb.shape[0]
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def bgr(self):
+        # Channel-reversed view, no copy
+        return self.rgb[:, :, ::-1]
+
+    def pil(self):
+        """
+        Read-only PIL Image backed by the RGB buffer.
+        """
+        if self._pil is None:
+            self._pil = Image.frombuffer("RGB", self.size, self.rgb, "raw", "RGB", 0, 1)
+        return self._pil
+
+    def detection_view(self, max_side=None):
+        """
+        Output: (BGR array with its longest side at most max_side, (scale_x, scale_y))
+                where scale maps detection coordinates back to this page
+        """
+        if not max_side or max(self.size) <= max_side:
+            return self.bgr, (1.0, 1.0)
+        ratio = max_side / max(self.size)
+        size = (max(1, round(self.width * ratio)), max(1, round(self.height * ratio)))
+        small = cv2.resize(self.rgb, size, interpolation=cv2.INTER_AREA)
+        return small[:, :, ::-1], (self.width / size[0], self.height / size[1])
+
+    def crop_rgb(self, box):
+        x1, y1, x2, y2 = box
+        return self.rgb[y1:y2, x1:x2]
+
+    def crop_bgr(self, box):
+        x1, y1, x2, y2 = box
+        return self.bgr[y1:y2, x1:x2]
+
+def load_image(source, bgr=False):
+    """
+    Input: Path, raw encoded bytes, PIL Image, numpy array or PageImage.
+           Numpy arrays are taken as RGB unless bgr=True (e.g. from cv2.imread).
+    Output: PageImage
+    """
+    if isinstance(source, PageImage):
+        return source
+
+    if isinstance(source, np.ndarray):
+        array = source
+        if array.ndim == 2:
+            array = cv2.cvtColor(array, cv2.COLOR_GRAY2BGR if bgr else cv2.COLOR_GRAY2RGB)
+        elif array.shape[2] == 4:
+            array = array[:, :, :3]
+        if bgr:
+            array = array[:, :, ::-1]
+        return PageImage(array)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = Image.open(io.BytesIO(source))
+    elif isinstance(source, (str, Path)):
+        source = Image.open(source)
+
+    if isinstance(source, Image.Image):
+        if source.mode != "RGB":
+            source = source.convert("RGB")
+        return PageImage(np.asarray(source))
+
+    raise TypeError(f"Unsupported image input: {type(source).__name__}")
+
+def load_for_detection(source, max_side):
+    """
+    Decodes straight to detection size where the format allows it: JPEG
+    files/bytes use PIL draft mode (DCT-domain 1/2, 1/4, 1/8 downscaling), so
+    the full-resolution pixels are never produced.
+    Output: (PageImage at most max_side on its longest side, original (width, height))
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = Image.open(io.BytesIO(source))
+    elif isinstance(source, (str, Path)):
+        source = Image.open(source)
+
+    if isinstance(source, Image.Image):
+        original = source.size
+        if source.format == "JPEG" and max_side and max(original) > max_side:
+            ratio = max_side / max(original)
+            source.draft("RGB", (round(original[0] * ratio), round(original[1] * ratio)))
+        page = load_image(source)
+    else:
+        page = load_image(source)
+        original = page.size
+
+    view, _ = page.detection_view(max_side)
+    if view.shape[:2] != page.rgb.shape[:2]:
+        page = PageImage(view[:, :, ::-1])
+    return page, original
@@ -0,0 +1,185 @@
+from contextlib import contextmanager, nullcontext
+import json
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_BUCKETS = (16, 32, 64, 128, 256, 384, 512, 768, 1024)
+PIXELS_BUCKETS = (1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2e6, 4e6, 8e6)
+
+class RunMetrics:
+    """
+    Measurements for one page: stage wall times, counters and sizes.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.values = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, value):
+        self.values.setdefault(name, []).append(value)
+
+    def as_dict(self):
+        return {
+            "stages": {k: round(v, 4) for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+            "values": dict(self.values),
+            "memory": memory_snapshot(),
+        }
+
+class _NullMetrics:
+    """
+    Stand-in used when metrics are off: every call is a no-op.
+    """
+    enabled = False
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def record(self, name, value):
+        pass
+
+NULL_METRICS = _NullMetrics()
+
+def memory_snapshot():
+    """
+    Output: Peak RSS of this process and peak GPU memory (if torch uses CUDA), in MB
+    """
+    snapshot = {}
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        snapshot["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        snapshot["gpu_peak_mb"] = round(torch.cuda.max_memory_allocated() / (1024 * 1024), 1)
+    return snapshot
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.n += 1
+
+    def as_dict(self):
+        return {
+            "count": self.n,
+            "sum": round(self.total, 4),
+            "buckets": {str(b): c for b, c in zip(list(self.buckets) + ["+Inf"], self.counts)},
+        }
+
+class MetricsRegistry:
+    """
+    Aggregates RunMetrics of many pages into histograms and counters,
+    exportable as Prometheus text or JSON.
+    """
+    def __init__(self, prefix="receipt_pipeline"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, run):
+        with self._lock:
+            self._counters["pages"] = self._counters.get("pages", 0) + 1
+            for stage, seconds in run.stages.items():
+                self._histogram("stage_seconds", SECONDS_BUCKETS, stage=stage).observe(seconds)
+            for name, value in run.counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for value in run.values.get("donut_tokens", []):
+                self._histogram("donut_tokens", TOKENS_BUCKETS).observe(value)
+            for value in run.values.get("donut_tokens_per_second", []):
+                self._histogram("donut_tokens_per_second", TOKENS_BUCKETS).observe(value)
+            for name in ("po_crop_pixels", "table_crop_pixels"):
+                for value in run.values.get(name, []):
+                    self._histogram(name, PIXELS_BUCKETS).observe(value)
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps({
+                "counters": dict(self._counters),
+                "histograms": {
+                    self._key(name, labels): hist.as_dict()
+                    for (name, labels), hist in self._histograms.items()
+                },
+                "memory": memory_snapshot(),
+            }, indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = f"{self.prefix}_{name}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+            typed = set()
+            for (name, labels), hist in sorted(self._histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                cumulative = 0
+                for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{metric}_bucket{{{label_text + ',' if label_text else ''}{le}}} {cumulative}")
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{metric}_sum{suffix} {hist.total}")
+                lines.append(f"{metric}_count{suffix} {hist.n}")
+
+        for name, value in memory_snapshot().items():
+            metric = f"{self.prefix}_{name}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def _histogram(self, name, buckets, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self._histograms:
+            self._histograms[key] = Histogram(buckets)
+        return self._histograms[key]
+
+    def _key(self, name, labels):
+        return name + "".join(f"[{k}={v}]" for k, v in labels)
@@ -1,4 +1,3 @@
-from paddleocr import PaddleOCR
 import numpy as np
 import cv2
 import re
@@ -8,10 +7,15 @@ import logging
 logging.getLogger("ppocr").setLevel(logging.ERROR)
 
 class TextReader:
-    def __init__(self, lang='en'):
+    def __init__(self, lang='en', rec_batch_num=16, min_confidence=0.8, use_angle_cls=True):
         print("[OCR] Loading PaddleOCR...")
+        # Deferred so importing this module stays cheap
+        from paddleocr import PaddleOCR
         # Initialize once to save memory
-        self.reader = PaddleOCR(use_angle_cls=True, lang=lang)
+        # use_angle_cls=False when pages are already made upright (see orientation.py)
+        self.reader = PaddleOCR(use_angle_cls=use_angle_cls, lang=lang, rec_batch_num=rec_batch_num)
+        # Recognition scores below this fall back to the full OCR pass
+        self.min_confidence = min_confidence
 
     def read_region(self, image_crop: np.ndarray):
         """
@@ -26,6 +30,44 @@ class TextReader:
         text = " ".join([line[1][0] for line in result[0]])
         return text.strip()
 
+    def read_regions(self, image_crops, stats=None):
+        """
+        Input: List of OpenCV Images (BGR), already tightly cropped by the detector
+        Output: One cleaned text string per crop
+
+        Skips text detection and angle classification and runs the recognizer
+        once over the whole batch. Crops it is unsure about (multi-line or
+        rotated text usually) are re-read with the full read_region pass.
+        """
+        texts = [""] * len(image_crops)
+        ids = [i for i, crop in enumerate(image_crops) if crop.size > 0]
+        if not ids:
+            return texts
+
+        if stats is None:
+            stats = {}
+        stats.setdefault("recognized", 0)
+        stats.setdefault("full_passes", 0)
+        stats.setdefault("full_pass_indices", [])
+
+        recognizer = getattr(self.reader, "text_recognizer", None)
+        if recognizer is None:
+            # This PaddleOCR build does not expose the recognizer on its own
+            for i in ids:
+                texts[i] = self.read_region(image_crops[i])
+            stats["full_passes"] += len(ids)
+            return texts
+
+        rec_res, _ = recognizer([np.ascontiguousarray(image_crops[i]) for i in ids])
+        stats["recognized"] += len(ids)
+        for i, (text, score) in zip(ids, rec_res):
+            if score < self.min_confidence or not text.strip():
+                text = self.read_region(image_crops[i])
+                stats["full_passes"] += 1
+                stats["full_pass_indices"].append(i)
+            texts[i] = text.strip()
+        return texts
+
     def validate_po(self, text):
         """
         Heuristic filter to check if text looks like a PO Number
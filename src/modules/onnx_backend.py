@@ -0,0 +1,107 @@
+from pathlib import Path
+import shutil
+
+# Backends accepted by TableDetector / TableParser / ReceiptPipeline
+BACKENDS = ("torch", "onnx")
+
+# Only the matrix multiplies are quantised: dynamic INT8 convolutions become
+# ConvInteger nodes, which the CPU provider has no int8-weight kernel for.
+# That suits Donut (transformer layers are MatMuls) but leaves YOLO, which is
+# almost all convolutions, effectively fp32, so the detector is exported
+# without quantisation. The tag is part of the artifact names, so artifacts
+# quantised differently are rebuilt instead of reused.
+QUANTIZED_OPS = ["MatMul", "Gemm"]
+QUANT_TAG = "int8mm"
+
+# Export directories written inside the Donut model directory (including the
+# one older versions wrote); they are not part of the model's revision
+EXPORT_DIRS = ("onnx", f"onnx-{QUANT_TAG}", "onnx-int8")
+
+def resolve_backend(backend, device):
+    """
+    "auto" picks ONNX Runtime on CPU and PyTorch everywhere else.
+    """
+    if backend == "auto":
+        return "onnx" if device == "cpu" else "torch"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS} or 'auto'")
+    return backend
+
+def _is_fresh(artifact, source):
+    """
+    True if the exported artifact exists and is newer than what it was built from.
+    """
+    artifact, source = Path(artifact), Path(source)
+    if not artifact.exists():
+        return False
+    if source.is_dir():
+        newest = max(p.stat().st_mtime for p in source.iterdir() if p.is_file())
+    else:
+        newest = source.stat().st_mtime
+    return artifact.stat().st_mtime >= newest
+
+def quantize_file(src, dst):
+    """
+    Dynamic INT8 quantisation (weights INT8, activations quantised at run time)
+    of the MatMul / Gemm nodes; convolutions stay in float.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(str(src), str(dst), weight_type=QuantType.QInt8, op_types_to_quantize=QUANTIZED_OPS)
+    return Path(dst)
+
+def export_detector(weights_path, imgsz=1280, quantize=False):
+    """
+    Exports the YOLO weights to ONNX next to them (best.onnx, fp32). With
+    quantize=True also best.int8mm.onnx, whose convolutions stay fp32 too.
+    Output: Path of the artifact to load; reused while newer than the weights
+    """
+    weights_path = Path(weights_path)
+    onnx_path = weights_path.with_suffix(".onnx")
+    int8_path = weights_path.with_suffix(f".{QUANT_TAG}.onnx")
+    target = int8_path if quantize else onnx_path
+
+    if _is_fresh(target, weights_path):
+        return target
+
+    if not _is_fresh(onnx_path, weights_path):
+        print(f"[ONNX] Exporting detector {weights_path.name} to ONNX...")
+        from ultralytics import YOLO
+        onnx_path = Path(YOLO(weights_path).export(format="onnx", dynamic=True, imgsz=imgsz))
+
+    if quantize:
+        print(f"[ONNX] Quantising {onnx_path.name} to INT8...")
+        quantize_file(onnx_path, int8_path)
+    return target
+
+def export_extractor(model_dir, quantize=True):
+    """
+    Exports the Donut encoder/decoder to ONNX under <model_dir>/onnx
+    (and <model_dir>/onnx-int8mm when quantised).
+    Output: Directory loadable with optimum's ORTModelForVision2Seq
+    """
+    model_dir = Path(model_dir)
+    onnx_dir = model_dir / "onnx"
+    int8_dir = model_dir / f"onnx-{QUANT_TAG}"
+    target = int8_dir if quantize else onnx_dir
+
+    if _is_fresh(target / "config.json", model_dir / "config.json"):
+        return target
+
+    if not _is_fresh(onnx_dir / "config.json", model_dir / "config.json"):
+        print(f"[ONNX] Exporting Donut from {model_dir} to ONNX...")
+        from optimum.onnxruntime import ORTModelForVision2Seq
+        from transformers import DonutProcessor
+        ORTModelForVision2Seq.from_pretrained(model_dir, export=True).save_pretrained(onnx_dir)
+        DonutProcessor.from_pretrained(model_dir).save_pretrained(onnx_dir)
+
+    if quantize:
+        print("[ONNX] Quantising Donut encoder/decoder to INT8...")
+        int8_dir.mkdir(parents=True, exist_ok=True)
+        for file in sorted(onnx_dir.iterdir()):
+            if file.suffix == ".onnx":
+                quantize_file(file, int8_dir / file.name)
+        # config.json last: it marks the directory as complete
+        for file in sorted(onnx_dir.iterdir(), key=lambda p: p.name == "config.json"):
+            if file.is_file() and file.suffix not in (".onnx", ".onnx_data"):
+                shutil.copy2(file, int8_dir / file.name)
+    return target
@@ -0,0 +1,198 @@
+"""
+One orientation + skew estimate per page, so OCR can run without its
+per-line angle classifier and YOLO / Donut see upright pages.
+
+Everything is measured on a small binarised copy of the page:
+    * quarter turn: across text lines the ink alternates with the gaps
+      between them, so the row profile varies far more than the column
+      profile (where every column crosses many lines); if the columns vary
+      more, the text runs vertically. Both are taken at their best skew
+      angle, since a slight skew already blurs the lines of a wide page
+    * upside down: text is left-aligned, so line starts line up better than
+      line ends; on a flipped page it is the other way round
+    * skew: the angle whose rotated row profile is sharpest, evaluated for
+      every candidate angle at once with one bincount
+"""
+import cv2
+import numpy as np
+
+from src.modules.loader import PageImage, load_image
+
+ANALYSIS_SIDE = 1000
+MAX_SKEW = 5.0
+SKEW_STEP = 0.2
+MIN_SKEW = 0.3          # smaller angles are left alone
+MAX_INK_POINTS = 20000
+
+def _ink(gray):
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary
+
+def _variation(profile):
+    # Squared coefficient of variation: independent of the profile's length and ink total
+    profile = profile.astype(np.float64)
+    mean = profile.mean()
+    return float(profile.var() / (mean * mean)) if mean > 0 else 0.0
+
+def _ink_points(binary):
+    ys, xs = np.nonzero(binary)
+    if len(ys) > MAX_INK_POINTS:
+        pick = np.random.default_rng(0).choice(len(ys), MAX_INK_POINTS, replace=False)
+        ys, xs = ys[pick], xs[pick]
+    return ys, xs
+
+def _row_profiles(ys, xs, angles):
+    # Row profile of the ink after rotating by each candidate angle: (angles, rows)
+    theta = np.deg2rad(angles)[:, None]
+    rows = np.round(ys[None, :] * np.cos(theta) - xs[None, :] * np.sin(theta)).astype(np.int64)
+    rows -= rows.min()
+    height = int(rows.max()) + 1
+    return np.bincount((rows + np.arange(len(angles))[:, None] * height).ravel(),
+                       minlength=len(angles) * height).reshape(len(angles), height)
+
+def _line_variation(binary, max_skew=MAX_SKEW, step=SKEW_STEP):
+    # How strongly the rows alternate between text and gaps, at the best skew
+    ys, xs = _ink_points(binary)
+    if len(ys) < 100:
+        return 0.0
+    profiles = _row_profiles(ys, xs, np.arange(-max_skew, max_skew + step / 2, step))
+    best = 0.0
+    for profile in profiles:
+        # Only the inked span counts, so page margins add no variation
+        inked = np.flatnonzero(profile)
+        best = max(best, _variation(profile[inked[0]:inked[-1] + 1]))
+    return best
+
+def _quarter_turn(binary, margin=1.5):
+    # 0 = text rows horizontal, 1 = vertical
+    upright = _line_variation(binary)
+    turned = _line_variation(np.ascontiguousarray(np.rot90(binary, 1)))
+    return 1 if turned > margin * upright else 0
+
+def _upside_down(binary, min_lines=3, min_height=3, tolerance=0.01, margin=0.15):
+    # Text lines = bands of consecutive rows with ink
+    has_ink = np.concatenate([[0], binary.any(axis=1).astype(np.int8), [0]])
+    edges = np.diff(has_ink)
+    tops, bottoms = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = bottoms - tops >= min_height
+    if keep.sum() < min_lines:
+        return False
+
+    # Leftmost / rightmost ink of every band
+    columns = np.logical_or.reduceat(binary.astype(bool), tops, axis=0)[keep]
+    starts = np.argmax(columns, axis=1)
+    ends = columns.shape[1] - 1 - np.argmax(columns[:, ::-1], axis=1)
+
+    def alignment(x):
+        # Share of lines sharing the most common edge position
+        close = np.abs(x[:, None] - x[None, :]) <= tolerance * binary.shape[1]
+        return close.sum(axis=1).max() / len(x)
+
+    # A ragged right margin is normal; ragged on the left means the page is flipped
+    return alignment(ends) > alignment(starts) + margin
+
+def _skew(binary, max_skew=MAX_SKEW, step=SKEW_STEP):
+    ys, xs = _ink_points(binary)
+    if len(ys) < 100:
+        return 0.0
+
+    angles = np.arange(-max_skew, max_skew + step / 2, step)
+    scores = (_row_profiles(ys, xs, angles).astype(np.float64) ** 2).sum(axis=1)
+
+    # The angle that levels the text lines is the correction to apply;
+    # a parabola through the peak and its neighbours refines it below the step
+    best = int(np.argmax(scores))
+    if 0 < best < len(angles) - 1:
+        left, mid, right = scores[best - 1:best + 2]
+        curvature = left - 2 * mid + right
+        if curvature < 0:
+            return float(angles[best] + step * 0.5 * (left - right) / curvature)
+    return float(angles[best])
+
+def estimate(page_image):
+    """
+    Input: PageImage
+    Output: {"quarter_turns": k (counter-clockwise 90° turns that make the page upright),
+             "skew": degrees to rotate by after that, "corrected": bool}
+    """
+    view, _ = page_image.detection_view(ANALYSIS_SIDE)
+    binary = _ink(cv2.cvtColor(np.ascontiguousarray(view), cv2.COLOR_BGR2GRAY))
+
+    turns = _quarter_turn(binary)
+    if turns:
+        binary = np.ascontiguousarray(np.rot90(binary, 1))
+
+    skew = _skew(binary)
+    if abs(skew) < MIN_SKEW:
+        skew = 0.0
+
+    # Line starts / ends are only found on level lines. A half turn commutes
+    # with the deskew, so the skew angle holds either way
+    if skew:
+        h, w = binary.shape
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), skew, 1.0)
+        binary = cv2.warpAffine(binary, matrix, (w, h), flags=cv2.INTER_NEAREST, borderValue=0)
+    if _upside_down(binary):
+        turns += 2
+    return {"quarter_turns": turns % 4, "skew": round(skew, 2), "corrected": bool(turns % 4 or skew)}
+
+def apply(image, transform):
+    """
+    Input: PageImage, PIL Image or RGB numpy array, and a transform from estimate()
+    Output: The upright page as a PageImage (the input itself when nothing changes)
+    """
+    page = load_image(image)
+    if not transform["corrected"]:
+        return page
+
+    rgb = page.rgb
+    if transform["quarter_turns"]:
+        rgb = np.rot90(rgb, transform["quarter_turns"])
+    if transform["skew"]:
+        h, w = rgb.shape[:2]
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), transform["skew"], 1.0)
+        rgb = cv2.warpAffine(np.ascontiguousarray(rgb), matrix, (w, h),
+                             flags=cv2.INTER_LINEAR, borderValue=(255, 255, 255))
+    return PageImage(rgb)
+
+def _turn_point(x, y, size, quarter_turns):
+    # Where (x, y) lands after np.rot90(image, k) on an image of size (w, h)
+    w, h = size
+    if quarter_turns == 1:
+        return y, w - x
+    if quarter_turns == 2:
+        return w - x, h - y
+    if quarter_turns == 3:
+        return h - y, x
+    return x, y
+
+def map_words(words, size, transform):
+    """
+    Moves word boxes of the original page into the coordinates of apply()'s output.
+    Input: [(x1, y1, x2, y2, text), ...] in pixels of the original page of size (w, h)
+    Output: Same list with every box replaced by the bounding box of its moved corners
+    """
+    if not transform["corrected"]:
+        return words
+
+    k = transform["quarter_turns"]
+    turned = (size[1], size[0]) if k % 2 else size
+    matrix = None
+    if transform["skew"]:
+        matrix = cv2.getRotationMatrix2D((turned[0] / 2, turned[1] / 2), transform["skew"], 1.0)
+
+    mapped = []
+    for x1, y1, x2, y2, text in words:
+        corners = np.array([_turn_point(x, y, size, k) for x, y in ((x1, y1), (x2, y1), (x1, y2), (x2, y2))])
+        if matrix is not None:
+            corners = corners @ matrix[:, :2].T + matrix[:, 2]
+        (nx1, ny1), (nx2, ny2) = corners.min(axis=0), corners.max(axis=0)
+        mapped.append((float(nx1), float(ny1), float(nx2), float(ny2), text))
+    return mapped
+
+def upright(page_image):
+    """
+    Output: (upright PageImage, transform)
+    """
+    transform = estimate(page_image)
+    return apply(page_image, transform), transform
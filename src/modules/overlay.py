@@ -0,0 +1,64 @@
+from PIL import ImageDraw
+
+# Pipeline debug levels
+DEBUG_OFF = "off"        # record nothing (batch runs)
+DEBUG_RECORD = "record"  # record boxes/labels as plain data, render on demand
+
+class DebugOverlay:
+    """
+    Records what the pipeline would draw (boxes, labels, colours) as plain,
+    JSON-serialisable data instead of drawing on a copy of the page.
+    """
+    enabled = True
+
+    def __init__(self, size):
+        self.size = list(size)
+        self.shapes = []
+
+    def rectangle(self, box, outline, width=1):
+        self.shapes.append({"type": "rect", "box": [int(v) for v in box], "color": outline, "width": width})
+
+    def text(self, xy, text, fill):
+        self.shapes.append({"type": "text", "xy": [int(v) for v in xy], "text": text, "color": fill})
+
+    def as_dict(self):
+        return {"size": self.size, "shapes": self.shapes}
+
+class _NullOverlay:
+    enabled = False
+
+    def rectangle(self, box, outline, width=1):
+        pass
+
+    def text(self, xy, text, fill):
+        pass
+
+NULL_OVERLAY = _NullOverlay()
+
+def render_overlay(image, debug, max_side=None):
+    """
+    Input: Page image (PIL, any resolution) and a result's "debug" dict
+    Output: New PIL Image with the recorded shapes drawn on it,
+            downscaled first so its longest side is at most max_side
+    """
+    canvas = image.convert("RGB")
+    if max_side and max(canvas.size) > max_side:
+        ratio = max_side / max(canvas.size)
+        canvas = canvas.resize((round(canvas.width * ratio), round(canvas.height * ratio)))
+    else:
+        canvas = canvas.copy()
+
+    # Shapes were recorded in the coordinates of the page the pipeline saw
+    sx = canvas.width / debug["size"][0]
+    sy = canvas.height / debug["size"][1]
+
+    draw = ImageDraw.Draw(canvas)
+    for shape in debug["shapes"]:
+        if shape["type"] == "rect":
+            x1, y1, x2, y2 = shape["box"]
+            width = max(1, round(shape["width"] * min(sx, sy)))
+            draw.rectangle([x1 * sx, y1 * sy, x2 * sx, y2 * sy], outline=shape["color"], width=width)
+        elif shape["type"] == "text":
+            x, y = shape["xy"]
+            draw.text((x * sx, y * sy), shape["text"], fill=shape["color"])
+    return canvas
@@ -0,0 +1,40 @@
+from pdf2image import convert_from_path, pdfinfo_from_bytes
+import tempfile
+
+DEFAULT_DPI = 200
+
+def count_pages(pdf_bytes):
+    """
+    Input: Raw PDF bytes
+    Output: Number of pages (read from the PDF info, nothing is rendered)
+    """
+    return int(pdfinfo_from_bytes(pdf_bytes)["Pages"])
+
+def render_page(pdf_bytes, page_number, dpi=DEFAULT_DPI):
+    """
+    Renders a single 1-based page to a PIL Image.
+    """
+    return next(iter_pdf_pages(pdf_bytes, dpi=dpi, first_page=page_number, last_page=page_number))[1]
+
+def iter_pdf_pages(pdf_bytes, dpi=DEFAULT_DPI, window=1, first_page=1, last_page=None):
+    """
+    Lazily renders a PDF, `window` pages at a time.
+    Yields: (page_number, PIL Image) with 1-based page numbers
+
+    Only one window of pages is held in memory, so peak memory does not
+    grow with the length of the document.
+    """
+    total = count_pages(pdf_bytes)
+    last_page = min(last_page or total, total)
+
+    # Write the PDF once; poppler re-reads it for every window
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        f.write(pdf_bytes)
+        f.flush()
+
+        for start in range(first_page, last_page + 1, window):
+            end = min(start + window - 1, last_page)
+            images = convert_from_path(f.name, dpi=dpi, first_page=start, last_page=end)
+            for offset, image in enumerate(images):
+                yield start + offset, image
+            del images
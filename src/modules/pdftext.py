@@ -0,0 +1,194 @@
+"""
+Text layer of digitally generated PDFs, read with poppler's pdftotext
+(installed alongside pdftoppm, which pdf2image already needs).
+"""
+from html import unescape
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+
+PAGE_PATTERN = re.compile(r'<page width="([\d.]+)" height="([\d.]+)">(.*?)</page>', re.S)
+WORD_PATTERN = re.compile(r'<word xMin="([\d.-]+)" yMin="([\d.-]+)" xMax="([\d.-]+)" yMax="([\d.-]+)">(.*?)</word>', re.S)
+
+class PageText:
+    """
+    Words of one page, in PDF points: [(x1, y1, x2, y2, text), ...]
+    """
+    def __init__(self, width, height, words):
+        self.width = width
+        self.height = height
+        self.words = words
+
+    def scaled(self, size):
+        """
+        Output: The words in the pixel coordinates of a rendering of `size` (width, height)
+        """
+        sx, sy = size[0] / self.width, size[1] / self.height
+        return [(x1 * sx, y1 * sy, x2 * sx, y2 * sy, text) for x1, y1, x2, y2, text in self.words]
+
+def available():
+    return shutil.which("pdftotext") is not None
+
+def read_text_layer(pdf_bytes, first_page=1, last_page=None):
+    """
+    Input: Raw PDF bytes
+    Output: {page number: PageText}; empty when pdftotext is not installed
+    """
+    if not available():
+        return {}
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        f.write(pdf_bytes)
+        f.flush()
+        command = ["pdftotext", "-bbox", "-enc", "UTF-8", "-f", str(first_page)]
+        if last_page:
+            command += ["-l", str(last_page)]
+        output = subprocess.run(command + [f.name, "-"], capture_output=True, check=True).stdout
+
+    pages = {}
+    for offset, match in enumerate(PAGE_PATTERN.finditer(output.decode("utf-8", errors="replace"))):
+        words = [
+            (float(x1), float(y1), float(x2), float(y2), unescape(text))
+            for x1, y1, x2, y2, text in WORD_PATTERN.findall(match.group(3))
+        ]
+        pages[first_page + offset] = PageText(float(match.group(1)), float(match.group(2)), words)
+    return pages
+
+def has_usable_text(page_text, min_words=10, min_readable=0.9):
+    """
+    A page is usable when it has enough words and they decode to real
+    characters (fonts without a Unicode map come out as replacement or
+    private-use characters).
+    """
+    if page_text is None or len(page_text.words) < min_words:
+        return False
+    chars = "".join(word[4] for word in page_text.words)
+    readable = sum(1 for c in chars if c.isprintable() and c != "�" and not 0xE000 <= ord(c) <= 0xF8FF)
+    return readable / max(1, len(chars)) >= min_readable
+
+def words_in_box(words, box):
+    """
+    Output: Words whose centre lies inside box, in reading order
+    """
+    x1, y1, x2, y2 = box
+    inside = [w for w in words if x1 <= (w[0] + w[2]) / 2 <= x2 and y1 <= (w[1] + w[3]) / 2 <= y2]
+    return [word for line in group_lines(inside) for word in line]
+
+def group_lines(words):
+    """
+    Groups words into text lines by vertical overlap.
+    Output: List of lines (each sorted left to right), top to bottom
+    """
+    lines = []
+    for word in sorted(words, key=lambda w: (w[1] + w[3]) / 2):
+        centre = (word[1] + word[3]) / 2
+        if lines:
+            last = lines[-1]
+            top = statistics.mean(w[1] for w in last)
+            bottom = statistics.mean(w[3] for w in last)
+            if top <= centre <= bottom:
+                last.append(word)
+                continue
+        lines.append([word])
+    return [sorted(line, key=lambda w: w[0]) for line in lines]
+
+def box_text(words, box):
+    return " ".join(w[4] for w in words_in_box(words, box))
+
+def _columns(lines, gap):
+    # Column extents = x ranges covered by some word on some line, merged across small gaps
+    spans = sorted((w[0], w[2]) for line in lines for w in line)
+    columns = [list(spans[0])]
+    for x1, x2 in spans[1:]:
+        if x1 - columns[-1][1] <= gap:
+            columns[-1][1] = max(columns[-1][1], x2)
+        else:
+            columns.append([x1, x2])
+    return columns
+
+def _key(text):
+    return re.sub(r"[^0-9a-z]+", "_", text.lower()).strip("_")
+
+# Printed column headers that mean the same field
+HEADER_ALIASES = (
+    ("item", "description", "desc", "product", "article", "name", "item_description"),
+    ("qty", "quantity", "units", "count", "pcs"),
+    ("price", "unit_price", "unit_cost", "rate", "cost"),
+    ("amount", "total", "line_total", "ext_price", "extended_price", "net_amount"),
+    ("sku", "item_no", "item_number", "part_no", "part_number", "code", "article_no"),
+)
+
+def _alias_group(name):
+    name = _key(name.removeprefix("s_"))
+    return next((n for n, group in enumerate(HEADER_ALIASES) if name in group), None)
+
+def map_header(header, fields):
+    """
+    Maps printed header keys onto the extractor's field names, so a table read
+    from the text layer has the same row keys as one read by Donut.
+    Input: header keys (see _key), field names of the extractor's schema
+    Output: One field name per header key, or None when any column doesn't map
+            to exactly one field
+    """
+    mapped = []
+    for key in header:
+        same = [f for f in fields if _key(f.removeprefix("s_")) == key]
+        group = _alias_group(key)
+        if not same and group is not None:
+            same = [f for f in fields if _alias_group(f) == group]
+        if len(same) != 1 or same[0] in mapped:
+            return None
+        mapped.append(same[0])
+    return mapped
+
+def table_from_words(words, box, fields, rows_key="table_rows", min_columns=2, min_filled=0.8):
+    """
+    Rebuilds a table from the words inside box: the first line is the header,
+    columns are the x ranges separated by gutters no word crosses.
+    fields: The extractor's field names; header cells are mapped onto them
+    Output: {rows_key: [{field: cell, ...}, ...]} or None when the layout is not
+            clearly tabular or the header doesn't map (the caller then falls back to Donut)
+    """
+    lines = group_lines([w for w in words_in_box(words, box)])
+    if len(lines) < 2:
+        return None
+
+    height = statistics.median(w[3] - w[1] for line in lines for w in line)
+    columns = _columns(lines, gap=height)
+    if len(columns) < min_columns:
+        return None
+
+    def cells(line):
+        row = [[] for _ in columns]
+        for word in line:
+            centre = (word[0] + word[2]) / 2
+            index = next(n for n, (x1, x2) in enumerate(columns) if x1 <= centre <= x2)
+            row[index].append(word[4])
+        return [" ".join(cell) for cell in row]
+
+    header = [_key(cell) for cell in cells(lines[0])]
+    if not all(header) or len(set(header)) != len(header):
+        return None
+    header = map_header(header, [f for f in fields if f != rows_key])
+    if header is None:
+        return None
+
+    rows = []
+    for line in lines[1:]:
+        values = cells(line)
+        filled = sum(1 for v in values if v)
+        # A line with a single filled cell continues the previous row (wrapped text)
+        if filled == 1 and rows:
+            n = next(i for i, v in enumerate(values) if v)
+            rows[-1][header[n]] = f"{rows[-1][header[n]]} {values[n]}".strip()
+            continue
+        rows.append(dict(zip(header, values)))
+
+    if not rows:
+        return None
+    complete = sum(1 for row in rows if sum(1 for v in row.values() if v) * 2 >= len(header))
+    if complete / len(rows) < min_filled:
+        return None
+    return {rows_key: rows}
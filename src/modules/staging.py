@@ -0,0 +1,188 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+# How often blocked workers look at the cancel flag
+_POLL_SECONDS = 0.1
+
+class StageError:
+    """
+    Marks an item whose stage raised; later stages pass it through untouched.
+    """
+    def __init__(self, stage, error):
+        self.stage = stage
+        self.error = error
+
+    def __repr__(self):
+        return f"{self.stage} failed: {self.error}"
+
+class Stage:
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+
+class StagedExecutor:
+    """
+    Runs items through a chain of stages, each with its own worker threads.
+
+    Stages are connected by bounded queues, so a slow stage pushes back on the
+    ones before it instead of letting work pile up in memory, and item N+1
+    can be in one stage while item N is in the next.
+
+    If the items iterator itself raises, the items already read still come
+    out and run() then re-raises that error. Closing run()'s generator early
+    (or calling close()) stops the feed and the workers.
+    """
+    def __init__(self, stages, queue_size=8):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self._queues = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._feed_error = None
+
+    def run(self, items, ordered=True):
+        """
+        Yields: (input index, result) for every item; a failed item yields a StageError.
+        ordered=True yields in input order, otherwise as items finish.
+        """
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._cancel.clear()
+        self._feed_error = None
+        remaining = [stage.workers for stage in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True)]
+        for position, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(position, remaining), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        output = self._queues[-1]
+        pending = {}
+        next_index = 0
+        try:
+            while True:
+                entry = self._get(output)
+                if entry is _DONE:
+                    break
+                if not ordered:
+                    yield entry
+                    continue
+                pending[entry[0]] = entry[1]
+                while next_index in pending:
+                    yield next_index, pending.pop(next_index)
+                    next_index += 1
+        finally:
+            # Normal end: the threads are done already. Early exit: stop them
+            self.close()
+            for thread in threads:
+                thread.join()
+
+        if self._feed_error is not None:
+            raise self._feed_error
+
+    def close(self):
+        """
+        Stops a running run(): the feed reads no more items and workers exit
+        after their current item.
+        """
+        self._cancel.set()
+
+    def queue_depths(self):
+        """
+        Output: Items currently waiting in front of each stage
+        """
+        if not self._queues:
+            return {stage.name: 0 for stage in self.stages}
+        return {stage.name: q.qsize() for stage, q in zip(self.stages, self._queues)}
+
+    def stats(self):
+        depths = self.queue_depths()
+        return {
+            stage.name: {
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "failed": stage.failed,
+                "busy_seconds": round(stage.busy_seconds, 3),
+                "queue_depth": depths[stage.name],
+                "max_queue_depth": stage.max_depth,
+            }
+            for stage in self.stages
+        }
+
+    def _put(self, q, entry):
+        # Blocks like q.put, but gives up once the run is cancelled
+        while not self._cancel.is_set():
+            try:
+                q.put(entry, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        # Blocks like q.get; a cancelled run reads as the end of the queue
+        while not self._cancel.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _feed(self, items):
+        first = self._queues[0]
+        try:
+            for index, item in enumerate(items):
+                if not self._put(first, (index, item)):
+                    return
+                self._record_depth(0)
+        except Exception as e:
+            # Raised by run() once the items already fed have come out
+            self._feed_error = e
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._put(first, _DONE)
+
+    def _work(self, position, remaining):
+        stage = self.stages[position]
+        inbox, outbox = self._queues[position], self._queues[position + 1]
+        while True:
+            entry = self._get(inbox)
+            if entry is _DONE:
+                break
+
+            index, item = entry
+            if not isinstance(item, StageError):
+                start = time.perf_counter()
+                try:
+                    item = stage.fn(item)
+                except Exception as e:
+                    item = StageError(stage.name, e)
+                with self._lock:
+                    stage.busy_seconds += time.perf_counter() - start
+                    stage.processed += 1
+                    stage.failed += isinstance(item, StageError)
+            if not self._put(outbox, (index, item)):
+                break
+            self._record_depth(position + 1)
+
+        # The last worker out tells every worker of the next stage to stop
+        with self._lock:
+            remaining[position] -= 1
+            last = remaining[position] == 0
+        if last:
+            following = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+            for _ in range(following):
+                self._put(outbox, _DONE)
+
+    def _record_depth(self, position):
+        if position < len(self.stages):
+            stage = self.stages[position]
+            stage.max_depth = max(stage.max_depth, self._queues[position].qsize())
@@ -0,0 +1,132 @@
+"""
+Lightweight stand-ins for the YOLO, PaddleOCR and Donut stages.
+
+They expose the same interfaces as TableDetector, TextReader and TableParser
+and do a small amount of real OpenCV work, so the pipeline plumbing around
+them (decoding, routing, batching, parsing, caching) can be benchmarked on a
+CPU-only machine with no weights and no network.
+"""
+from src.modules.donut_parser import DonutTagParser
+from src.modules.ocr import TextReader
+from src.modules.tiling import input_aspect
+import numpy as np
+import cv2
+import time
+
+# Donut's encoder input size as the processor stores it (height first)
+DONUT_SIZE = {"height": 1280, "width": 960}
+# Paddle's recognizer input height
+REC_HEIGHT = 48
+
+def _gray(image):
+    array = np.asarray(image)
+    if array.ndim == 3:
+        return cv2.cvtColor(np.ascontiguousarray(array), cv2.COLOR_BGR2GRAY)
+    return array
+
+class StandInDetector:
+    """
+    Finds ruled boxes with a threshold + contour pass. Boxes covering more
+    than table_fraction of the page are tables (class 1), smaller ones PO boxes (class 0).
+    """
+    def __init__(self, min_area=5000, table_fraction=0.1):
+        self.min_area = min_area
+        self.table_fraction = table_fraction
+        self.device = "cpu"
+
+    def detect(self, image, conf=0.1, imgsz=None):
+        return self.detect_batch([image], conf=conf)[0]
+
+    def detect_batch(self, images, conf=0.1, imgsz=None):
+        return [self._detect(image) for image in images]
+
+    def _detect(self, image):
+        gray = _gray(image)
+        _, binary = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY_INV)
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        page_area = gray.shape[0] * gray.shape[1]
+        detections = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w * h < self.min_area:
+                continue
+            detections.append({
+                "class_id": 1 if w * h > self.table_fraction * page_area else 0,
+                "conf": 0.9,
+                "bbox": [x, y, x + w, y + h],
+            })
+        return detections
+
+class _StandInPaddle:
+    """
+    Mimics the two PaddleOCR entry points TextReader uses.
+    """
+    def text_recognizer(self, crops):
+        start = time.perf_counter()
+        return [self._recognize(crop) for crop in crops], time.perf_counter() - start
+
+    def predict(self, crop):
+        text, score = self._recognize(crop)
+        h, w = crop.shape[:2]
+        return [[[[[0, 0], [w, 0], [w, h], [0, h]], (text, score)]]]
+
+    def _recognize(self, crop):
+        gray = _gray(crop)
+        scale = REC_HEIGHT / max(1, gray.shape[0])
+        line = cv2.resize(gray, (max(1, int(gray.shape[1] * scale)), REC_HEIGHT))
+        ink = int((line < 128).sum())
+        return f"PO-{10000 + ink % 90000}", 0.95
+
+class StandInReader(TextReader):
+    """
+    TextReader with the Paddle engine swapped out; read_region(s) and
+    validate_po are the real implementations.
+    """
+    def __init__(self, lang='en', rec_batch_num=16, min_confidence=0.8, use_angle_cls=True):
+        self.reader = _StandInPaddle()
+        self.min_confidence = min_confidence
+
+class StandInExtractor:
+    """
+    Resizes each crop to Donut's input size, finds table rows from the ruling
+    lines and emits a Donut-style tag sequence that goes through the real parser.
+    """
+    def __init__(self, expected_keys=("table_rows",)):
+        self.expected_keys = tuple(expected_keys)
+        self.device = "cpu"
+        self.backend = "standin"
+        self.input_aspect = input_aspect(DONUT_SIZE)
+        # The tags _generate emits
+        self.field_names = ("item", "price", "qty", "table_rows")
+
+    def extract_table(self, image_crop):
+        return self.extract_tables([image_crop])[0]
+
+    def extract_tables(self, image_crops, stats=None):
+        start = time.perf_counter()
+        sequences = [self._generate(crop) for crop in image_crops]
+        generate_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tables = [DonutTagParser().feed(seq).root for seq in sequences]
+        if stats is not None:
+            stats["tokens"] = [seq.count("<") * 2 for seq in sequences]
+            stats["generate_seconds"] = generate_seconds
+            stats["parse_seconds"] = time.perf_counter() - start
+            stats["stop_reasons"] = [None] * len(sequences)
+        return tables
+
+    def _generate(self, crop):
+        gray = cv2.resize(_gray(crop), (DONUT_SIZE["width"], DONUT_SIZE["height"]), interpolation=cv2.INTER_AREA)
+        # A row whose pixels are mostly dark is a ruling line
+        ruled = (gray < 160).mean(axis=1) > 0.6
+        edges = np.flatnonzero(np.diff(ruled.astype(np.int8)) == 1)
+
+        parts = []
+        for n in range(max(0, len(edges) - 2)):
+            parts.append(
+                f"<table_rows><item>Row {n + 1}</item><qty>{n % 9 + 1}</qty>"
+                f"<price>{n * 1.5:.2f}</price></table_rows>"
+            )
+        return "".join(parts)
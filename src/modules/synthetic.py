@@ -0,0 +1,134 @@
+from PIL import Image, ImageDraw, ImageFont
+import io
+import random
+
+# Letter page at 200 DPI, the app's default render size
+PAGE_SIZE = (1700, 2200)
+COLUMNS = ("item", "qty", "price")
+
+def _draw_table(draw, rng, left, top, right, rows, max_bottom, col_offsets, row_height=44):
+    """
+    Draws a ruled item / qty / price table (header row + `rows` rows).
+    Output: (table box, list of row dicts)
+    """
+    table_rows = []
+    for _ in range(rows):
+        table_rows.append({
+            "item": f"Widget {rng.choice('ABCDEFGH')}{rng.randint(1, 99)}",
+            "qty": str(rng.randint(1, 20)),
+            "price": f"{rng.randint(1, 500)}.{rng.randint(0, 99):02d}",
+        })
+    bottom = min(max_bottom, top + row_height * (rows + 1))
+    table_box = [left, top, right, bottom]
+    draw.rectangle(table_box, outline="black", width=3)
+
+    col_x = [left] + [left + offset for offset in col_offsets] + [right]
+    for x in col_x[1:-1]:
+        draw.line([x, top, x, bottom], fill="black", width=2)
+    for r, row in enumerate([dict(zip(COLUMNS, COLUMNS))] + table_rows):
+        y = top + r * row_height
+        if y + row_height > bottom:
+            break
+        if r > 0:
+            draw.line([left, y, right, y], fill="black", width=1)
+        for c, key in enumerate(COLUMNS):
+            draw.text((col_x[c] + 12, y + 14), row[key], fill="black")
+    return table_box, table_rows
+
+def make_receipt(rows=12, seed=0, size=PAGE_SIZE):
+    """
+    Draws a receipt-like page: header text, a boxed PO number and a ruled table.
+    Output: (PIL Image, ground truth dict with boxes, PO number and table rows)
+    """
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+
+    # Header noise
+    for line in range(4):
+        y = 60 + line * 40
+        draw.text((80, y), f"ACME SUPPLY CO. {rng.randint(100, 999)} MAIN ST", fill="black")
+
+    # PO box
+    po_number = f"PO-{rng.randint(10000, 99999)}"
+    po_box = [width - 560, 80, width - 160, 160]
+    draw.rectangle(po_box, outline="black", width=3)
+    draw.text((po_box[0] + 30, po_box[1] + 30), po_number, fill="black")
+
+    # Table
+    table_box, table_rows = _draw_table(draw, rng, 100, 320, width - 100, rows, height - 80, (800, 1100))
+
+    truth = {"po_box": po_box, "table_box": table_box, "po_number": po_number, "table_rows": table_rows}
+    return image, truth
+
+def make_split_receipt(rows=12, seed=0, size=PAGE_SIZE):
+    """
+    A page with two separate tables (top left and bottom right), as on
+    receipts with a goods and a services section. Their union box covers
+    most of the page.
+    Output: (PIL Image, ground truth dict with "table_boxes" instead of "table_box")
+    """
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+
+    po_number = f"PO-{rng.randint(10000, 99999)}"
+    po_box = [width - 560, 80, width - 160, 160]
+    draw.rectangle(po_box, outline="black", width=3)
+    draw.text((po_box[0] + 30, po_box[1] + 30), po_number, fill="black")
+
+    half = (width - 300) // 2
+    first_box, first_rows = _draw_table(draw, rng, 100, 320, 100 + half, rows, height // 2, (370, 520))
+    second_box, second_rows = _draw_table(
+        draw, rng, width - 100 - half, height // 2 + 200, width - 100, rows, height - 80, (370, 520)
+    )
+
+    truth = {"po_box": po_box, "table_boxes": [first_box, second_box], "po_number": po_number,
+             "table_rows": first_rows + second_rows}
+    return image, truth
+
+WORDS = (
+    "invoice", "total", "amount", "due", "net", "payable", "order", "item", "quantity", "price",
+    "unit", "tax", "shipping", "handling", "customer", "account", "number", "date", "terms", "remit",
+)
+
+def make_text_page(lines=60, seed=0, size=PAGE_SIZE, font_size=28, line_spacing=1.2):
+    """
+    A text-dense page (letters, terms and conditions) in a TrueType font:
+    left-aligned lines of words with a ragged right edge. Unlike make_receipt
+    pages, character strokes dominate the ink, not ruling lines.
+    Output: PIL Image
+    """
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+
+    y = 100
+    for _ in range(lines):
+        if y + font_size > height - 100:
+            break
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 14)))
+        while len(line) > 10 and draw.textlength(line, font=font) > width - 240:
+            line = line.rsplit(" ", 1)[0]
+        draw.text((120, y), line, fill="black", font=font)
+        y += int(font_size * line_spacing)
+    return image
+
+def make_document(pages=3, rows=12, seed=0):
+    """
+    Output: List of (page_number, PIL Image) pairs, like iter_pdf_pages yields
+    """
+    return [(n + 1, make_receipt(rows=rows, seed=seed + n)[0]) for n in range(pages)]
+
+def make_pdf(pages=3, rows=12, seed=0):
+    """
+    Output: Raw bytes of a multi-page PDF of synthetic receipts
+    """
+    images = [image for _, image in make_document(pages, rows, seed)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:], resolution=200)
+    return buffer.getvalue()
@@ -0,0 +1,90 @@
+import numpy as np
+
+# Fallback band shape: Donut's usual encoder input of 1280 high by 960 wide
+DONUT_ASPECT = 1280 / 960
+
+def input_aspect(size):
+    """
+    Input: A Donut image processor's `size`: {"height": h, "width": w}, or
+           [h, w] in older configs (height first in both)
+    Output: Encoder input height / width
+    """
+    if isinstance(size, dict):
+        return size["height"] / size["width"]
+    height, width = size
+    return height / width
+
+def split_row_bands(crop, max_ratio=1.0, band_ratio=DONUT_ASPECT, overlap=0.2, ink_threshold=160):
+    """
+    Splits a tall table crop into overlapping horizontal bands.
+
+    Input: RGB numpy array of the table
+           max_ratio: crops taller than max_ratio * width are split
+           band_ratio: band height as a fraction of the width; the encoder's aspect
+                       (see input_aspect) makes each band fill the input without padding
+           overlap: fraction of a band shared with the next one
+    Output: List of (y_start, y_end) row ranges covering the crop
+    """
+    height, width = crop.shape[:2]
+    if height <= max_ratio * width:
+        return [(0, height)]
+
+    band = max(1, int(band_ratio * width))
+    step = max(1, int(band * (1 - overlap)))
+    slack = max(1, int(band * overlap / 2))
+
+    # Ink per row; cuts snap to the emptiest row near the target so text lines stay whole
+    gray = crop.mean(axis=2) if crop.ndim == 3 else crop
+    ink = (gray < ink_threshold).sum(axis=1)
+
+    bands = []
+    start = 0
+    while True:
+        target = start + band
+        if target >= height:
+            bands.append((start, height))
+            return bands
+        lo, hi = max(start + step // 2, target - slack), min(height, target + slack)
+        end = lo + int(np.argmin(ink[lo:hi])) if hi > lo else target
+        bands.append((start, end))
+
+        # Next band starts `overlap` before this one ends, also at a quiet row
+        next_start = max(start + 1, end - (band - step))
+        lo, hi = max(start + 1, next_start - slack), min(end, next_start + slack)
+        start = lo + int(np.argmin(ink[lo:hi])) if hi > lo else next_start
+
+def _normalise_row(row):
+    if isinstance(row, dict):
+        return tuple(sorted((k, " ".join(str(v).split())) for k, v in row.items()))
+    return " ".join(str(row).split())
+
+def merge_band_tables(tables, rows_key="table_rows"):
+    """
+    Stitches the Donut outputs of consecutive bands back into one table.
+    Rows repeated because they sit in the overlap between two bands are dropped.
+    """
+    merged = {}
+    rows = []
+    for table in tables:
+        band_rows = table.get(rows_key, [])
+        if isinstance(band_rows, dict):
+            band_rows = [band_rows]
+
+        # Longest suffix of what we have that the new band starts with
+        keys = [_normalise_row(r) for r in band_rows]
+        tail = [_normalise_row(r) for r in rows[-len(keys):]] if keys else []
+        shared = 0
+        for k in range(min(len(tail), len(keys)), 0, -1):
+            if tail[-k:] == keys[:k]:
+                shared = k
+                break
+        rows.extend(band_rows[shared:])
+
+        # Any other field: the first band that has it wins
+        for key, value in table.items():
+            if key != rows_key and key not in merged:
+                merged[key] = value
+
+    if rows:
+        merged[rows_key] = rows
+    return merged
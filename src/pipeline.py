@@ -1,101 +1,812 @@
-import cv2
-import numpy as np
-import torch
+import importlib
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from PIL import Image, ImageDraw
 
-# Import our new modules
-from src.modules.detector import TableDetector
+# Import our new modules (light: the heavy frameworks load on first use)
+from src.modules.detector import TableDetector, network_size, scale_detections
 from src.modules.ocr import TextReader
-from src.modules.extractor import TableParser
+from src.modules.extractor import TableParser, schema_fields
+from src.modules.pages import DEFAULT_DPI, iter_pdf_pages
+from src.modules.cache import ResultCache, content_hash, hash_bytes, model_revision
+from src.modules.loader import load_image
+from src.modules.onnx_backend import EXPORT_DIRS, resolve_backend
+from src.modules.staging import Stage, StageError, StagedExecutor
+from src.modules.metrics import NULL_METRICS, MetricsRegistry, RunMetrics
+from src.modules.overlay import DEBUG_OFF, DEBUG_RECORD, NULL_OVERLAY, DebugOverlay
+from src.modules.tiling import merge_band_tables, split_row_bands
+from src.modules.boxes import cluster_boxes, merge_tables
+from src.modules.layout import fingerprint
+from src.modules.orientation import map_words, upright
+from src.modules.pdftext import box_text, has_usable_text, read_text_layer, table_from_words
+
+# Stage name -> framework it imports
+STAGES = {
+    "detector": "ultralytics",
+    "reader": "paddleocr",
+    "extractor": "transformers",
+}
+
+# Threads per stage in process_stream
+DEFAULT_STAGE_WORKERS = {"decode": 2, "detect": 1, "ocr": 1, "extract": 1}
 
 class ReceiptPipeline:
-    def __init__(self):
+    # Bump when a code change alters results, so old cache entries stop matching
+    CACHE_VERSION = 3
+
+    def __init__(self, cache_path=None, cache_max_bytes=512 * 1024 * 1024, device=None, warmup=False,
+                 backend="torch", metrics=False, modules=None, debug=DEBUG_RECORD,
+                 layouts=None):
         self.ROOT = Path(__file__).parent.parent.resolve()
-        
+
+        # Settings (part of the cache key)
+        self.detect_conf = 0.1
+        # Longest page side (px) YOLO sees; None = full resolution. Boxes are mapped
+        # back to the full page, so crops for OCR/Donut keep their resolution
+        self.detect_size = None
+        self.table_padding = (20, 10)
+        # Table boxes are clustered into separate tables (each its own crop) instead
+        # of one union crop: boxes under table_min_conf are dropped, boxes within
+        # table_gap px are one table, and clusters smaller than table_min_area_ratio
+        # of the largest (and less confident) are stray detections
+        self.table_clustering = True
+        self.table_min_conf = 0.25
+        self.table_gap = 20
+        self.table_min_area_ratio = 0.05
+        self.ocr_min_confidence = 0.8
+        # Row-band tiling: tables taller than tile_max_ratio * width are decoded as
+        # overlapping bands (tile_overlap of a band) and stitched back together
+        self.table_tiling = False
+        self.tile_max_ratio = 1.0
+        self.tile_overlap = 0.2
+        # One orientation + deskew pass per page before detection; OCR then
+        # runs without Paddle's per-line angle classifier
+        self.correct_orientation = False
+
         # Paths
-        yolo_path = self.ROOT / "models" / "detector" / "receipt_detector_v1" / "weights" / "best.pt"
-        donut_path = self.ROOT / "models" / "extractor"
-        
-        # Device Check
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        # Initialize Modules
-        self.detector = TableDetector(yolo_path, device)
-        self.reader = TextReader()
-        self.extractor = TableParser(donut_path, device)
-        
-        print(">>> PIPELINE READY <<<")
-
-    def process(self, image_path):
-        # 1. Load Image
-        pil_image = Image.open(image_path).convert("RGB")
-        cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        
+        self.yolo_path = self.ROOT / "models" / "detector" / "receipt_detector_v1" / "weights" / "best.pt"
+        self.donut_path = self.ROOT / "models" / "extractor"
+
+        # Modules load lazily on first use (see warmup)
+        # backend: "torch", "onnx" (ONNX Runtime on CPU: fp32 YOLO, INT8 Donut) or "auto" (ONNX on CPU only)
+        # modules: Optional {stage name: object} to use instead of loading the models
+        self._backend = backend
+        self._device = device
+        self._modules = dict(modules or {})
+        self._locks = {name: threading.Lock() for name in STAGES}
+        self._device_lock = threading.Lock()
+        self.startup_times = {}
+        self.last_executor = None
+        self._table_fields = None
+
+        # Per-page instrumentation, aggregated here (None = off, zero overhead)
+        self.metrics = MetricsRegistry() if metrics else None
+
+        # Debug overlay: DEBUG_RECORD keeps boxes/labels as data in result["debug"]
+        # (see overlay.render_overlay), DEBUG_OFF skips overlay work entirely
+        if debug not in (DEBUG_OFF, DEBUG_RECORD):
+            raise ValueError(f"Unknown debug level '{debug}'")
+        self.debug = debug
+
+        # Known vendor templates (LayoutIndex): a matching page reuses the
+        # template's boxes instead of running YOLO, new templates are learned
+        self.layouts = layouts
+
+        # Result Cache (keyed on content + model revisions + settings). The model
+        # revisions are fixed here; the settings are read on every lookup, since
+        # they are plain attributes that can change after construction
+        self.cache = None
+        if cache_path is not None:
+            namespace = hash_bytes(json.dumps({
+                "version": self.CACHE_VERSION,
+                "detector": model_revision(self.yolo_path),
+                "extractor": model_revision(self.donut_path, exclude=EXPORT_DIRS),
+            }, sort_keys=True).encode())
+            self.cache = ResultCache(cache_path, max_bytes=cache_max_bytes, namespace=namespace)
+
+        if warmup:
+            self.warmup()
+            print(">>> PIPELINE READY <<<")
+
+    # --- LAZY MODULES ---
+    @property
+    def detector(self):
+        return self._module("detector")
+
+    @property
+    def reader(self):
+        return self._module("reader")
+
+    @property
+    def extractor(self):
+        return self._module("extractor")
+
+    @property
+    def device(self):
+        with self._device_lock:
+            if self._device is None:
+                # Device Check
+                torch = self._import("torch")
+                self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+
+    @property
+    def backend(self):
+        return resolve_backend(self._backend, self.device)
+
+    def warmup(self, stages=tuple(STAGES), parallel=True):
+        """
+        Loads the given stages now instead of on first use.
+        With parallel=True each stage loads in its own thread.
+        """
+        start = time.perf_counter()
+        if parallel and len(stages) > 1:
+            with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+                list(pool.map(self._module, stages))
+        else:
+            for name in stages:
+                self._module(name)
+        self.startup_times["warmup"] = time.perf_counter() - start
+
+    def startup_report(self):
+        """
+        Output: Seconds spent per framework import and per model load so far
+        """
+        report = {"imports": {}, "loads": {}}
+        for key, seconds in self.startup_times.items():
+            kind, _, name = key.partition(":")
+            if kind == "import":
+                report["imports"][name] = round(seconds, 3)
+            elif kind == "load":
+                report["loads"][name] = round(seconds, 3)
+        report["warmup"] = round(self.startup_times.get("warmup", 0.0), 3)
+        return report
+
+    def _module(self, name):
+        module = self._modules.get(name)
+        if module is None:
+            with self._locks[name]:
+                if name not in self._modules:
+                    self._import(STAGES[name])
+                    with self._timed(f"load:{name}"):
+                        self._modules[name] = self._build(name)
+                module = self._modules[name]
+        return module
+
+    def _build(self, name):
+        # Only the torch-based stages resolve the device (which imports torch);
+        # an OCR-only job never loads it
+        if name == "detector":
+            return TableDetector(self.yolo_path, self.device, backend=self.backend)
+        if name == "reader":
+            return TextReader(min_confidence=self.ocr_min_confidence, use_angle_cls=not self.correct_orientation)
+        return TableParser(self.donut_path, self.device, backend=self.backend)
+
+    def _import(self, module_name):
+        # The first import pays the cost; later ones are a dict lookup
+        with self._timed(f"import:{module_name}"):
+            return importlib.import_module(module_name)
+
+    @contextmanager
+    def _timed(self, key):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_times.setdefault(key, time.perf_counter() - start)
+
+    def settings(self):
+        """
+        Output: Every tunable that changes the result of a page
+        """
+        return {
+            "detect_conf": self.detect_conf,
+            "detect_size": self.detect_size,
+            "table_padding": list(self.table_padding),
+            "table_clustering": [self.table_clustering, self.table_min_conf, self.table_gap, self.table_min_area_ratio],
+            "ocr_min_confidence": self.ocr_min_confidence,
+            "backend": self._backend,
+            "table_tiling": [self.table_tiling, self.tile_max_ratio, self.tile_overlap],
+            "correct_orientation": self.correct_orientation,
+            # Results recorded without the overlay have no "debug" data to serve
+            "debug": self.debug,
+        }
+
+    def process(self, image):
+        """
+        Input: Image path, raw encoded bytes, PIL Image or RGB numpy array
+        Output: Result dict
+        """
+        # 1. Check Cache & Load Image
+        job = self._stage_decode(image)
+
         # 2. Run Detection
-        detections = self.detector.detect(pil_image)
-        
-        debug_image = pil_image.copy()
-        draw = ImageDraw.Draw(debug_image)
-        
-        # 3. Processing Variables
-        po_candidates = []
-        table_boxes = []
-        
-        # 4. Route Detections to Correct Modules
+        job = self._stage_detect(job)
+
+        # 3. Route Detections & Read PO Crops
+        job = self._stage_ocr(job)
+
+        # 4. Extract Table
+        job = self._stage_extract(job)
+
+        return job['result']
+
+    def stream_executor(self, workers=None, queue_size=8):
+        """
+        Builds a StagedExecutor running decode -> detect -> ocr -> extract,
+        each stage in its own thread pool with bounded queues in between.
+
+        workers: Optional {stage name: thread count}. Model stages default to
+        one thread each since the models are not safe to call concurrently;
+        the gain comes from the stages overlapping across documents.
+        """
+        workers = {**DEFAULT_STAGE_WORKERS, **(workers or {})}
+        return StagedExecutor([
+            Stage("decode", self._stage_decode, workers["decode"]),
+            Stage("detect", self._stage_detect, workers["detect"]),
+            Stage("ocr", self._stage_ocr, workers["ocr"]),
+            Stage("extract", self._stage_extract, workers["extract"]),
+        ], queue_size=queue_size)
+
+    def process_stream(self, images, workers=None, queue_size=8, ordered=True):
+        """
+        Pipelined version of process_batch: document N+1 is detected while
+        document N is being extracted.
+        Yields: (input index, result dict); failures yield {"error": ...}
+        The executor (for queue depths / stats) is kept as self.last_executor.
+        An error raised by the images iterator itself is re-raised; stopping
+        early stops the stage threads.
+        """
+        self.last_executor = self.stream_executor(workers, queue_size)
+        jobs = self.last_executor.run(images, ordered=ordered)
+        try:
+            for index, job in jobs:
+                if isinstance(job, StageError):
+                    yield index, {"error": f"{job.stage.capitalize()} failed: {job.error}"}
+                else:
+                    yield index, job['result']
+        finally:
+            jobs.close()
+
+    def process_batch(self, images, batch_size=8, text_layers=None):
+        """
+        Input: List of image paths, raw bytes, PIL Images or RGB numpy arrays
+               text_layers: Optional list of PageText (or None) per image
+        Output: One result dict per input, in input order.
+                A page that fails gets {"error": ...} instead of failing the batch.
+        """
+        images = list(images)
+        text_layers = list(text_layers or [None] * len(images))
+        results = []
+        for start in range(0, len(images), batch_size):
+            end = start + batch_size
+            results.extend(self._process_chunk(images[start:end], text_layers=text_layers[start:end]))
+        return results
+
+    def process_pages(self, pages, window=1, text_layers=None):
+        """
+        Input: Iterable of (page_number, image) pairs, e.g. from iter_pdf_pages
+               text_layers: Optional {page_number: PageText} from read_text_layer
+        Yields: (page_number, result dict) as soon as each window is processed
+        """
+        text_layers = text_layers or {}
+        pages = self._timed_pages(pages)
+        while True:
+            chunk = list(itertools.islice(pages, window))
+            if not chunk:
+                return
+            numbers = [number for number, _, _ in chunk]
+            results = self._process_chunk(
+                [image for _, image, _ in chunk],
+                stage_times=[{"render": seconds} for _, _, seconds in chunk],
+                text_layers=[text_layers.get(number) for number in numbers]
+            )
+            del chunk
+            for number, result in zip(numbers, results):
+                result['page'] = number
+                yield number, result
+
+    def process_pdf(self, pdf_bytes, dpi=DEFAULT_DPI, window=1, text_layer=True):
+        """
+        Renders and processes a PDF page by page.
+        text_layer: Pages with usable embedded text take the PO number and, when the
+                    layout is clearly tabular, the line items from the text layer
+                    instead of OCR/Donut (YOLO still finds the regions)
+        Yields: (page_number, result dict) for every page of the document;
+                result["path"] says which path the page took
+        """
+        text_layers = self.read_text_layers(pdf_bytes) if text_layer else {}
+        yield from self.process_pages(
+            iter_pdf_pages(pdf_bytes, dpi=dpi, window=window), window=window, text_layers=text_layers
+        )
+
+    def read_text_layers(self, pdf_bytes):
+        """
+        Output: {page_number: PageText} for the pages whose text layer is usable
+        """
+        return {n: t for n, t in read_text_layer(pdf_bytes).items() if has_usable_text(t)}
+
+    def _process_chunk(self, sources, stage_times=None, text_layers=None):
+        results = [None] * len(sources)
+        cache_keys = {}
+        metrics = [self._new_metrics() for _ in sources]
+        for m, times in zip(metrics, stage_times or []):
+            for name, seconds in times.items():
+                m.add_time(name, seconds)
+        text_layers = text_layers or [None] * len(sources)
+
+        # 1. Load Images (cache hits skip the whole chunk), make them upright
+        page_images = {}
+        transforms = {}
+        sizes = {}
+        for i, source in enumerate(sources):
+            try:
+                with metrics[i].stage("decode"):
+                    cache_keys[i], results[i] = self._cache_lookup(source, text=text_layers[i] is not None)
+                    if results[i] is None:
+                        page_images[i] = load_image(source)
+                    else:
+                        metrics[i].count("cache_hits")
+            except Exception as e:
+                results[i] = {"error": f"Could not load image: {e}"}
+                continue
+            if i in page_images:
+                sizes[i] = page_images[i].size
+                page_images[i], transform = self._upright(page_images[i], metrics[i])
+                if transform is not None:
+                    transforms[i] = transform
+
+        # 2. Run Detection (one batched pass, per page on failure)
+        detections = {}
+        ids = list(page_images)
+        try:
+            with self._shared_stage("detect", [metrics[i] for i in ids]):
+                detections = dict(zip(ids, self._detect([page_images[i] for i in ids], [metrics[i] for i in ids])))
+        except Exception:
+            for i in ids:
+                try:
+                    with metrics[i].stage("detect"):
+                        detections[i] = self._detect([page_images[i]], [metrics[i]])[0]
+                except Exception as e:
+                    results[i] = {"error": f"Detection failed: {e}"}
+
+        # 3. Route Detections
+        pages = {}
+        for i, dets in detections.items():
+            try:
+                with metrics[i].stage("route"):
+                    pages[i] = self._route(page_images[i], dets)
+                if i in transforms:
+                    pages[i]['orientation'] = transforms[i]
+                self._record_crops(metrics[i], pages[i])
+            except Exception as e:
+                results[i] = {"error": f"Routing failed: {e}"}
+
+        # 3b. Text Layer (digital PDFs: fill PO / table from embedded words, skip OCR / Donut)
+        tables = {}
+        for i in list(pages):
+            if text_layers[i] is None:
+                continue
+            try:
+                with metrics[i].stage("text_layer"):
+                    # Words are in the rendered page's coordinates; boxes are upright
+                    words = text_layers[i].scaled(sizes[i])
+                    if i in transforms:
+                        words = map_words(words, sizes[i], transforms[i])
+                    tables.update(self._read_text_layer(i, pages[i], words))
+            except Exception:
+                # Whatever the text layer didn't fill goes through OCR / Donut
+                pages[i]['path'] = "raster"
+
+        # 4. Read PO Crops (one recognition batch across pages, per page on failure)
+        ids = [i for i in pages if 'po_number' not in pages[i]]
+        try:
+            ocr_stats = {}
+            with self._shared_stage("ocr", [metrics[i] for i in ids]):
+                texts = self.reader.read_regions([crop for i in ids for crop in pages[i]['po_crops']], stats=ocr_stats)
+            full_passes = set(ocr_stats.get("full_pass_indices", []))
+            offset = 0
+            for i in ids:
+                count = len(pages[i]['po_crops'])
+                metrics[i].count("ocr_calls", count + sum(1 for n in range(offset, offset + count) if n in full_passes))
+                pages[i] = self._read_po(pages[i], texts[offset:offset + count])
+                offset += count
+        except Exception:
+            for i in ids:
+                if 'po_crops' not in pages[i]:
+                    continue
+                try:
+                    with metrics[i].stage("ocr"):
+                        pages[i] = self._read_po(pages[i], self._read_regions(pages[i]['po_crops'], metrics[i]))
+                except Exception as e:
+                    results[i] = {"error": f"OCR failed: {e}"}
+                    del pages[i]
+
+        # 5. Extract Tables (every table crop of the chunk in one batched generate,
+        #    per page on failure)
+        table_ids = [i for i in pages if pages[i]['table_crops'] and i not in tables]
+        failed = set()
+        try:
+            crops, owners = [], []
+            for i in table_ids:
+                crops.extend(pages[i]['table_crops'])
+                owners.extend([i] * len(pages[i]['table_crops']))
+            donut_stats = {}
+            with self._shared_stage("extract", [metrics[i] for i in table_ids]):
+                batch = self._extract_crops(crops, stats=donut_stats)
+            grouped = {i: [] for i in table_ids}
+            for n, (i, table) in enumerate(zip(owners, batch)):
+                grouped[i].append(table)
+                self._record_donut(metrics[i], donut_stats, n)
+            tables.update((i, merge_tables(grouped[i], rows_key="table_rows")) for i in table_ids)
+        except Exception:
+            for i in table_ids:
+                try:
+                    with metrics[i].stage("extract"):
+                        tables[i] = merge_tables(self._extract(pages[i]['table_crops'], metrics[i]), rows_key="table_rows")
+                except Exception as e:
+                    tables[i] = {"error": f"Extraction failed: {e}"}
+                    failed.add(i)
+
+        # 6. Final Package (failed extractions are retried next time, not cached)
+        for i, page in pages.items():
+            results[i] = self._package(page, tables.get(i, {}))
+            if i not in failed:
+                self._cache_store(cache_keys.get(i), results[i])
+        for i, result in enumerate(results):
+            self._attach_metrics(result, metrics[i])
+        return results
+
+    # --- STAGES (one document each; a cache hit skips the rest) ---
+    def _stage_decode(self, source):
+        m = self._new_metrics()
+        with m.stage("decode"):
+            cache_key, cached = self._cache_lookup(source)
+            if cached is not None:
+                m.count("cache_hits")
+                return {"result": self._attach_metrics(cached, m)}
+            # Decoded once, every stage works on views of it
+            image = load_image(source)
+        job = {"cache_key": cache_key, "metrics": m}
+        job['image'], transform = self._upright(image, m)
+        if transform is not None:
+            job['orientation'] = transform
+        return job
+
+    def _stage_detect(self, job):
+        if 'result' not in job:
+            with job['metrics'].stage("detect"):
+                job['detections'] = self._detect([job['image']], [job['metrics']])[0]
+        return job
+
+    def _detect(self, page_images, metrics):
+        """
+        Known layouts reuse their template boxes (optionally verified by a
+        low-resolution YOLO pass); every other page runs YOLO.
+        Output: One detection list per page, in full-page coordinates
+        """
+        detections = [None] * len(page_images)
+        if self.layouts is not None:
+            fingerprints = [fingerprint(image) for image in page_images]
+            templates = [self.layouts.match(fp) for fp in fingerprints]
+            matched = [i for i, t in enumerate(templates) if t is not None]
+
+            if matched and self.layouts.verify:
+                checks = self._run_detector([page_images[i] for i in matched], self.layouts.verify_size)
+                matched = [i for i, dets in zip(matched, checks)
+                           if self.layouts.agrees(templates[i], dets, page_images[i].size)]
+            for i in matched:
+                detections[i] = self.layouts.use(templates[i], page_images[i].size)
+                metrics[i].count("layout_hits")
+
+        missing = [i for i, dets in enumerate(detections) if dets is None]
+        if missing:
+            batch = self._run_detector([page_images[i] for i in missing], self.detect_size)
+            for i, dets in zip(missing, batch):
+                detections[i] = dets
+                if self.layouts is not None and templates[i] is None:
+                    self.layouts.learn(fingerprints[i], dets, page_images[i].size)
+        return detections
+
+    def _run_detector(self, page_images, max_side):
+        """
+        Runs YOLO on views of the pages downscaled to max_side.
+        Output: One detection list per page, in full-page coordinates
+        """
+        views = [image.detection_view(max_side) for image in page_images]
+        batch = self.detector.detect_batch([view for view, _ in views], conf=self.detect_conf,
+                                           imgsz=network_size(max_side))
+        return [scale_detections(dets, scale, image.size)
+                for dets, (_, scale), image in zip(batch, views, page_images)]
+
+    def _stage_ocr(self, job):
+        if 'result' not in job:
+            m = job['metrics']
+            with m.stage("route"):
+                page = self._route(job.pop('image'), job.pop('detections'))
+            if 'orientation' in job:
+                page['orientation'] = job.pop('orientation')
+            self._record_crops(m, page)
+            with m.stage("ocr"):
+                # One recognition batch for the page
+                job['page'] = self._read_po(page, self._read_regions(page['po_crops'], m))
+        return job
+
+    def _stage_extract(self, job):
+        if 'result' not in job:
+            m = job.pop('metrics')
+            page = job.pop('page')
+            final_json = {}
+            if page['table_crops']:
+                # --- EXTRACTOR MODULE ---
+                with m.stage("extract"):
+                    final_json = merge_tables(self._extract(page['table_crops'], m), rows_key="table_rows")
+            result = self._cache_store(job['cache_key'], self._package(page, final_json))
+            job['result'] = self._attach_metrics(result, m)
+        return job
+
+    # --- METRICS ---
+    def _new_metrics(self):
+        return RunMetrics() if self.metrics is not None else NULL_METRICS
+
+    def _attach_metrics(self, result, m):
+        if m.enabled and result is not None:
+            self.metrics.observe(m)
+            result['metrics'] = m.as_dict()
+        return result
+
+    @contextmanager
+    def _shared_stage(self, name, metrics):
+        # A batched call: every page in the batch is charged its wall time
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            for m in metrics:
+                m.add_time(name, seconds)
+                m.record("batch_size", len(metrics))
+
+    def _record_crops(self, m, page):
+        if m.enabled:
+            for crop in page['po_crops']:
+                m.record("po_crop_pixels", int(crop.shape[0] * crop.shape[1]))
+            for crop in page['table_crops']:
+                m.record("table_crop_pixels", int(crop.shape[0] * crop.shape[1]))
+            m.count("table_crops", len(page['table_crops']))
+
+    def _read_regions(self, crops, m):
+        stats = {}
+        texts = self.reader.read_regions(crops, stats=stats)
+        m.count("ocr_calls", stats.get("recognized", 0) + stats.get("full_passes", 0))
+        return texts
+
+    def _extract_crops(self, crops, stats=None):
+        """
+        extract_tables with row-band tiling: every band of every crop goes
+        through one batched generate, then each crop's bands are stitched.
+        stats["tokens"] is summed per crop.
+        """
+        if not self.table_tiling:
+            return self.extractor.extract_tables(crops, stats=stats)
+
+        bands, owners = [], []
+        for n, crop in enumerate(crops):
+            for y1, y2 in split_row_bands(crop, max_ratio=self.tile_max_ratio, overlap=self.tile_overlap,
+                                          band_ratio=self.extractor.input_aspect):
+                bands.append(crop[y1:y2])
+                owners.append(n)
+
+        band_stats = {} if stats is not None else None
+        outputs = self.extractor.extract_tables(bands, stats=band_stats)
+
+        grouped = [[] for _ in crops]
+        for owner, table in zip(owners, outputs):
+            grouped[owner].append(table)
+
+        if stats is not None:
+            stats.update(band_stats)
+            stats["tokens"] = [0] * len(crops)
+            stats["bands"] = [len(tables) for tables in grouped]
+            for owner, tokens in zip(owners, band_stats.get("tokens", [])):
+                stats["tokens"][owner] += tokens
+        return [merge_band_tables(tables) if len(tables) > 1 else tables[0] for tables in grouped]
+
+    def _extract(self, crops, m):
+        stats = {}
+        tables = self._extract_crops(crops, stats=stats)
+        for n in range(len(crops)):
+            self._record_donut(m, stats, n)
+        return tables
+
+    def _record_donut(self, m, stats, n):
+        if not m.enabled or not stats:
+            return
+        tokens = stats["tokens"][n]
+        m.record("donut_tokens", tokens)
+        if "bands" in stats:
+            m.count("table_bands", stats["bands"][n])
+        if stats["generate_seconds"] > 0:
+            m.record("donut_tokens_per_second", round(tokens / stats["generate_seconds"], 1))
+        m.add_time("donut_generate", stats["generate_seconds"])
+        m.add_time("donut_parse", stats["parse_seconds"])
+
+    def _timed_pages(self, pages):
+        # Wraps a page iterator so each page carries the time it took to produce
+        # (for iter_pdf_pages that is the PDF rasterisation)
+        pages = iter(pages)
+        while True:
+            start = time.perf_counter()
+            try:
+                number, image = next(pages)
+            except StopIteration:
+                return
+            yield number, image, time.perf_counter() - start
+
+    def _cache_lookup(self, source, text=False):
+        """
+        text: the page will use its PDF text layer, which can give a different result
+        Output: (cache key, cached result or None)
+        """
+        if self.cache is None:
+            return None, None
+        settings = hash_bytes(json.dumps(self.settings(), sort_keys=True).encode())
+        key = self.cache.key(f"{settings}:{content_hash(source)}" + (":text" if text else ""))
+        return key, self.cache.get(key)
+
+    def _cache_store(self, key, result):
+        if key is not None:
+            # Timings belong to this run only
+            self.cache.put(key, {k: v for k, v in result.items() if k != 'metrics'})
+        return result
+
+    def _route(self, page_image, detections):
+        """
+        Splits detections into PO crops (for OCR) and one crop per table.
+        Crops are views into the page buffer, not copies.
+        Output: Dict with the PO crops, the table crops / boxes (top to bottom,
+                empty when there is no table) and the debug overlay
+        """
+        draw = DebugOverlay(page_image.size) if self.debug == DEBUG_RECORD else NULL_OVERLAY
+
+        # 1. Processing Variables
+        po_boxes = []
+        table_dets = []
+
+        # 2. Route Detections to Correct Modules
         for det in detections:
             x1, y1, x2, y2 = det['bbox']
-            
-            # --- PO NUMBER (Class 0) -> OCR MODULE ---
+
+            # --- PO NUMBER (Class 0) -> COLLECT FOR OCR ---
             if det['class_id'] == 0:
                 draw.rectangle([x1, y1, x2, y2], outline="red", width=2)
-                
-                # Crop for Paddle
-                po_crop = cv_image[y1:y2, x1:x2]
-                text = self.reader.read_region(po_crop)
-                score = self.reader.validate_po(text)
-                
-                if score > 0:
-                    po_candidates.append({"text": text, "score": score, "bbox": [x1, y1, x2, y2]})
-                    draw.text((x1, y1-15), text, fill="red")
-
-            # --- TABLE (Class 1) -> COLLECT FOR MERGING ---
+                po_boxes.append([x1, y1, x2, y2])
+
+            # --- TABLE (Class 1) -> COLLECT FOR CLUSTERING ---
             elif det['class_id'] == 1:
-                table_boxes.append([x1, y1, x2, y2])
-        
-        # 5. Select Best PO
-        final_po = "Not Detected"
-        if po_candidates:
-            best = sorted(po_candidates, key=lambda x: x['score'], reverse=True)[0]
-            final_po = best['text']
-            draw.rectangle(best['bbox'], outline="green", width=5)
+                table_dets.append(det)
+
+        # 3. Crop for Paddle (BGR)
+        po_crops = [page_image.crop_bgr(box) for box in po_boxes]
+
+        # 4. Group Table Boxes (one union box when clustering is off)
+        if self.table_clustering:
+            regions = [c['bbox'] for c in cluster_boxes(
+                table_dets, min_conf=self.table_min_conf, gap=self.table_gap,
+                min_area_ratio=self.table_min_area_ratio
+            )]
+        elif table_dets:
+            boxes = [det['bbox'] for det in table_dets]
+            regions = [[min(b[0] for b in boxes), min(b[1] for b in boxes),
+                        max(b[2] for b in boxes), max(b[3] for b in boxes)]]
+        else:
+            regions = []
 
-        # 6. Merge Table Boxes & Extract
-        final_json = {}
-        if table_boxes:
-            # Union Logic
-            ux1 = min([b[0] for b in table_boxes])
-            uy1 = min([b[1] for b in table_boxes])
-            ux2 = max([b[2] for b in table_boxes])
-            uy2 = max([b[3] for b in table_boxes])
-            
+        table_crops, table_boxes = [], []
+        pad_x, pad_y = self.table_padding
+        for ux1, uy1, ux2, uy2 in regions:
             # Padding
-            pad_x, pad_y = 20, 10
             crop_box = (
                 max(0, ux1 - pad_x), max(0, uy1 - pad_y),
-                min(pil_image.width, ux2 + pad_x), min(pil_image.height, uy2 + pad_y)
+                min(page_image.width, ux2 + pad_x), min(page_image.height, uy2 + pad_y)
             )
-            
             draw.rectangle(crop_box, outline="green", width=5)
-            table_crop = pil_image.crop(crop_box)
-            
-            # --- EXTRACTOR MODULE ---
-            final_json = self.extractor.extract_table(table_crop)
-        else:
+            # Crop for Donut (RGB)
+            table_crops.append(page_image.crop_rgb(crop_box))
+            table_boxes.append(crop_box)
+
+        return {
+            "po_boxes": po_boxes, "po_crops": po_crops,
+            "table_crops": table_crops, "table_boxes": table_boxes, "draw": draw
+        }
+
+    def _read_po(self, page, texts):
+        """
+        Scores the OCR text of every PO crop and keeps the best candidate.
+        """
+        draw = page['draw']
+
+        po_candidates = []
+        for bbox, text in zip(page['po_boxes'], texts):
+            score = self.reader.validate_po(text)
+            if score > 0:
+                po_candidates.append({"text": text, "score": score, "bbox": bbox})
+                draw.text((bbox[0], bbox[1]-15), text, fill="red")
+
+        # Select Best PO
+        page['po_number'] = "Not Detected"
+        if po_candidates:
+            best = sorted(po_candidates, key=lambda x: x['score'], reverse=True)[0]
+            page['po_number'] = best['text']
+            draw.rectangle(best['bbox'], outline="green", width=5)
+
+        if draw.enabled:
+            page['debug'] = draw.as_dict()
+        for key in ('draw', 'po_boxes', 'po_crops'):
+            del page[key]
+        return page
+
+    def _upright(self, page_image, m):
+        """
+        Output: (upright page, transform) or (page, None) when correction is off.
+        Everything downstream (boxes, crops, overlay) is in upright coordinates.
+        """
+        if not self.correct_orientation:
+            return page_image, None
+        with m.stage("orient"):
+            page_image, transform = upright(page_image)
+        if transform["corrected"]:
+            m.count("orientation_corrected")
+        return page_image, transform
+
+    def _read_text_layer(self, i, page, words):
+        """
+        Fills the PO number (and the table, when the words form a clear grid)
+        from the page's text layer. Whatever can't be read that way is left
+        for OCR / Donut.
+        Output: {i: table} when the table came from the text layer
+        """
+        texts = [box_text(words, box) for box in page['po_boxes']]
+        from_text = []
+        if any(self.reader.validate_po(text) > 0 for text in texts):
+            self._read_po(page, texts)
+            from_text.append("po")
+
+        # Every table of the page has to read as a grid, else Donut does them all
+        tables = {}
+        if page['table_boxes']:
+            fields = self._extractor_fields()
+            found = [table_from_words(words, box, fields, rows_key="table_rows") for box in page['table_boxes']]
+            if all(table is not None for table in found):
+                tables[i] = merge_tables(found, rows_key="table_rows")
+                from_text.append("table")
+
+        needed = 1 + bool(page['table_boxes'])
+        page['path'] = "text" if len(from_text) == needed else ("mixed" if from_text else "raster")
+        return tables
+
+    def _extractor_fields(self):
+        """
+        Output: The extractor's field names, without loading it just for them
+        """
+        if self._table_fields is None:
+            extractor = self._modules.get("extractor")
+            self._table_fields = extractor.field_names if extractor is not None else schema_fields(self.donut_path)
+        return self._table_fields
+
+    def _package(self, page, final_json):
+        if not page['table_crops']:
             final_json = {"error": "No table detected"}
 
-        # 7. Final Package
-        final_json['po_number'] = final_po
-        final_json['debug_image'] = debug_image
-        
-        return final_json
\ No newline at end of file
+        final_json['po_number'] = page['po_number']
+        final_json['path'] = page.get('path', "raster")
+        if 'orientation' in page:
+            final_json['orientation'] = page['orientation']
+        if 'debug' in page:
+            final_json['debug'] = page['debug']
+
+        return final_json